@@ -0,0 +1,53 @@
+"""
+ZIP archives streamed while they are built.
+
+Entries are stored, not compressed, since photos are already compressed.
+ZipFile writes into a buffer without seek(), so sizes go to data
+descriptors after each entry and every chunk can be handed to the
+client as soon as it is written. Nothing is kept beyond one chunk and
+nothing touches the disk.
+"""
+import zipfile
+
+
+class _ChunkBuffer:
+    """Write-only stream ZipFile writes to, drained after every write."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(entries, date_time, chunk_size=64 * 1024):
+    """
+    Yield the bytes of a ZIP archive of (name, open file) pairs.
+
+    Every file is closed once copied. When the consumer stops early, as
+    on a client disconnect, no further file is opened.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, file in entries:
+            info = zipfile.ZipInfo(name, date_time)
+            with file, archive.open(info, 'w') as entry:
+                while chunk := file.read(chunk_size):
+                    entry.write(chunk)
+                    yield buffer.drain()
+    # The last entry's data descriptor and the central directory.
+    yield buffer.drain()
@@ -0,0 +1,69 @@
+"""
+Versioned response cache for album list and detail.
+
+Every cached response key embeds a version number. Writes bump the
+version of the affected album and of the list instead of deleting keys,
+so stale entries are never read again and simply expire.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+LIST_VERSION_KEY = 'albums:list:version'
+
+
+def _version_key(pk):
+    if pk is None:
+        return LIST_VERSION_KEY
+    return f'albums:{pk}:version'
+
+
+def _response_key(request, pk, version):
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    scope = 'list' if pk is None else pk
+    return f'albums:{scope}:{version}:{url}'
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Start from the clock so an evicted version never comes back.
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_version(pk=None):
+    """Return the current version of the list or an album, start one."""
+    key = _version_key(pk)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def get_response_data(request, version, pk=None):
+    """Return response data cached under version or None."""
+    return cache.get(_response_key(request, pk, version))
+
+
+def set_response_data(request, data, version, pk=None):
+    """
+    Cache response data under version.
+
+    The version must be read before the data, a write invalidating in
+    between then leaves the data under a version no longer read.
+    """
+    cache.set(
+        _response_key(request, pk, version), data,
+        timeout=settings.ALBUM_CACHE_TIMEOUT)
+
+
+def invalidate(pk=None):
+    """Bump the list version and the album version if given."""
+    _bump(LIST_VERSION_KEY)
+    if pk is not None:
+        _bump(_version_key(pk))
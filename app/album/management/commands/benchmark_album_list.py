@@ -0,0 +1,86 @@
+import timeit
+from datetime import date
+from functools import reduce
+
+from rest_framework.renderers import JSONRenderer
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from album.serializers import AlbumListRepresentation, AlbumSerializer
+from core.models import Album
+from core.renderers import FastJSONRenderer
+
+
+class Command(BaseCommand):
+    """Benchmark album list serialization and JSON rendering."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        owner = get_user_model()(email='bench@example.com', name='bench')
+        albums = [
+            Album(id=i, owner=owner, title=f'Album {i}',
+                  like_count=i, created_date=date(2023, 1, 1))
+            for i in range(1, rows + 1)
+        ]
+        for album in albums:
+            album.liked_by_me = album.id % 2 == 0
+        representation = AlbumListRepresentation()
+        # Build the rows .values() would return for the same albums.
+        values = [
+            {
+                lookup: reduce(getattr, lookup.split('__'), album)
+                for _, lookup, _ in representation.fields
+            }
+            for album in albums
+        ]
+
+        renderer = JSONRenderer()
+        serializer_output = renderer.render(
+            AlbumSerializer(albums, many=True).data)
+        fast_output = renderer.render(
+            representation.to_representation(values))
+        if serializer_output != fast_output:
+            raise CommandError('Fast representation output differs.')
+
+        serializer_time = min(timeit.repeat(
+            lambda: AlbumSerializer(albums, many=True).data,
+            number=1, repeat=repeat))
+        fast_time = min(timeit.repeat(
+            lambda: representation.to_representation(values),
+            number=1, repeat=repeat))
+
+        per_row = 1e6 / rows
+        self.stdout.write(
+            f'AlbumSerializer:         {serializer_time * per_row:.2f} '
+            'us/row')
+        self.stdout.write(
+            f'AlbumListRepresentation: {fast_time * per_row:.2f} us/row')
+        self.stdout.write(self.style.SUCCESS(
+            f'Speedup: {serializer_time / fast_time:.1f}x, '
+            'output is byte-identical.'))
+
+        payload = {
+            'next': None,
+            'previous': None,
+            'results': AlbumSerializer(albums, many=True).data,
+        }
+        fast_renderer = FastJSONRenderer()
+        if renderer.render(payload) != fast_renderer.render(payload):
+            raise CommandError('FastJSONRenderer output differs.')
+        renderer_time = min(timeit.repeat(
+            lambda: renderer.render(payload), number=1, repeat=repeat))
+        fast_renderer_time = min(timeit.repeat(
+            lambda: fast_renderer.render(payload), number=1, repeat=repeat))
+        self.stdout.write(
+            f'JSONRenderer:            {renderer_time * per_row:.2f} us/row')
+        self.stdout.write(
+            f'FastJSONRenderer:        {fast_renderer_time * per_row:.2f} '
+            'us/row')
+        self.stdout.write(self.style.SUCCESS(
+            f'Speedup: {renderer_time / fast_renderer_time:.1f}x, '
+            'output is byte-identical.'))
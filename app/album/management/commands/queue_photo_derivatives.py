@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from album.tasks import make_photo_derivatives
+from core.models import AlbumPhoto, ImageStatus
+
+
+class Command(BaseCommand):
+    """Queue derivative rendering for photos that have none yet."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--failed', action='store_true',
+            help='Also retry photos whose rendering failed.')
+
+    def handle(self, *args, **options):
+        statuses = [ImageStatus.PENDING]
+        if options['failed']:
+            statuses.append(ImageStatus.FAILED)
+        pks = AlbumPhoto.objects.filter(status__in=statuses).values_list(
+            'pk', flat=True)
+        queued = 0
+        for pk in pks.iterator():
+            make_photo_derivatives.delay(pk)
+            queued += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Queued {queued} photo(s).'))
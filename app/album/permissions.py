@@ -13,6 +13,6 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         if view.action == 'like_album':
             return True
         try:
-            return obj.owner == request.user
+            return obj.owner_id == request.user.pk
         except AttributeError:
-            return obj.album.owner == request.user
+            return obj.album.owner_id == request.user.pk
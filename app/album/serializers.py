@@ -1,51 +1,318 @@
+import os
+
 from rest_framework import serializers
 
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from core import images
+from core.models import Album, AlbumPhoto, PhotoUpload
+from core.utils import ImageValidator
+
+from .tasks import schedule_derivatives
 
-from core.models import Album, AlbumPhoto
-from core.utils import is_image_gif_ext, image_size_validator
 
+class SparseFieldsMixin:
+    """Keep only the field names passed in the `fields` argument."""
 
-class AlbumSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class AlbumSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     owner = serializers.StringRelatedField()
-    likes = serializers.IntegerField(source='likes.count', read_only=True)
+    likes = serializers.IntegerField(source='like_count', read_only=True)
+    # Annotated by the view for authenticated users, skipped otherwise.
+    liked_by_me = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Album
-        fields = '__all__'
+        fields = (
+            'id', 'owner', 'likes', 'liked_by_me', 'title', 'created_date')
         read_only_fields = ('owner', 'id')
 
     def validate(self, data):
         """Check that user has no more than 3 albums."""
-        user = self.context.get('request').user
-        number_of_albums = user.album_set.count()
-        if number_of_albums == settings.ALBUM_LIMIT:
+        if self.instance is None:
+            self.check_quota(
+                settings.ALBUM_LIMIT
+                - self.context.get('request').user.album_count)
+        return data
+
+    def create(self, validated_data):
+        """Recheck the quota under a lock on the owner's row."""
+        owner = validated_data['owner']
+        with transaction.atomic():
+            self.check_quota(get_user_model().objects.album_slots(owner.pk))
+            return super().create(validated_data)
+
+    def check_quota(self, remaining):
+        if remaining < 1:
             msg = _(f'There are only available {settings.ALBUM_LIMIT} albums.')
             raise serializers.ValidationError({'album': msg})
+
+
+class AlbumListRepresentation:
+    """
+    Read-only fast path with the same output as AlbumSerializer.
+
+    Rows are read with .values() and turned into dicts by a precompiled
+    field plan, skipping per-field serializer overhead.
+    """
+    # Output name: (values() lookup, converter applied to non-null values)
+    plan = {
+        'id': ('id', None),
+        # StringRelatedField renders str(user), which is the username.
+        'owner': (f'owner__{get_user_model().USERNAME_FIELD}', str),
+        'likes': ('like_count', None),
+        'liked_by_me': ('liked_by_me', None),
+        'title': ('title', None),
+        'created_date': ('created_date', lambda value: value.isoformat()),
+    }
+
+    def __init__(self, fields=AlbumSerializer.Meta.fields):
+        self.fields = [(name, *self.plan[name]) for name in fields]
+
+    @classmethod
+    def supports(cls, fields):
+        return set(fields) <= set(cls.plan)
+
+    def values(self, queryset):
+        """Return a .values() queryset with every looked up column."""
+        lookups = dict.fromkeys(['id'] + [f[1] for f in self.fields])
+        return queryset.values(*lookups)
+
+    def to_representation(self, rows):
+        data = []
+        for row in rows:
+            item = {}
+            for name, lookup, convert in self.fields:
+                value = row[lookup]
+                if convert is not None and value is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
         return data
 
 
+def photo_quota_msg():
+    return _(f"Ensure that an album has no more than {settings.ALBUM_PHOTOS_LIMIT} elements.") # noqa
+
+
+def duplicate_msg():
+    return _('A near duplicate of this photo is already in the album.')
+
+
 class AlbumPhotoSerializer(serializers.HyperlinkedModelSerializer):
-    image = serializers.ImageField(
-        allow_empty_file=False, validators=(
-            is_image_gif_ext,
-            image_size_validator
-        ))
+    # ImageValidator checks the header, no need for a decoding ImageField.
+    image = serializers.FileField(
+        allow_empty_file=False, validators=(ImageValidator(),))
+
+    sizes = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    duplicate_of = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = AlbumPhoto
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'status', 'sizes', 'srcset', 'duplicate_of')
+        read_only_fields = ('status',)
+
+    def get_sizes(self, photo):
+        """Map size names to dimensions and derivative urls by format."""
+        request = self.context.get('request')
+        storage = photo.image.storage
+
+        def url(name):
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+
+        return {
+            name: {
+                key: url(value) if key in images.FORMATS else value
+                for key, value in size.items()
+            }
+            for name, size in photo.sizes.items()
+        }
+
+    def get_srcset(self, photo):
+        """Return an <img srcset> value for every derivative format."""
+        sizes = self.get_sizes(photo).values()
+        return {
+            extension: ', '.join(
+                f'{size[extension]} {size["width"]}w'
+                for size in sizes if extension in size)
+            for extension in images.FORMATS
+            if any(extension in size for size in sizes)
+        }
 
     def validate(self, data):
         """Check that album does not have no more that 10 photos."""
-        album = self.context.get('view').get_object()
-        number_of_photos = settings.ALBUM_PHOTOS_LIMIT - album.images.count()
-        if not number_of_photos:
-            msg = _(f"Ensure that an album has no more than {settings.ALBUM_PHOTOS_LIMIT} elements.") # noqa
-            raise serializers.ValidationError({'image': msg})
-        return {'album': album, 'image': data.get('image')}
+        album = self.context.get('album') or self.context['view'].get_object()
+        self.check_quota(settings.ALBUM_PHOTOS_LIMIT - album.photo_count)
+        image = data.get('image')
+        phash = images.perceptual_hash(image)
+        duplicate = album.images.near_duplicates(
+            [phash], settings.ALBUM_PHOTO_DUPLICATE_DISTANCE).get(phash)
+        if duplicate is not None and settings.ALBUM_PHOTO_REJECT_DUPLICATES:
+            raise serializers.ValidationError(
+                {'image': duplicate_msg()}, code='duplicate')
+        return {
+            'album': album,
+            'image': image,
+            'phash': phash,
+            'duplicate_of': duplicate,
+        }
+
+    def create(self, validated_data):
+        """Recheck the quota under a lock on the album's row."""
+        with transaction.atomic():
+            self.check_quota(
+                Album.objects.photo_slots(validated_data['album'].pk))
+            photo = AlbumPhoto(**validated_data)
+            AlbumPhoto.store_images([photo])
+            photo.save()
+            schedule_derivatives([photo.pk])
+        return photo
+
+    def check_quota(self, remaining):
+        if remaining < 1:
+            raise serializers.ValidationError({'image': photo_quota_msg()})
+
+
+class AlbumPhotoBatchSerializer(serializers.Serializer):
+    """
+    Validate several uploaded images against one album quota check.
+
+    Every file is checked on its own so the view can report per-file
+    results; with a truthy `partial` in the context the valid files are
+    kept even when others are rejected, otherwise any rejection fails
+    the whole batch.
+    """
+    images = serializers.ListField(
+        child=serializers.FileField(), allow_empty=False, write_only=True)
+
+    def validate(self, data):
+        """Validate each file and mark the ones over the album quota."""
+        image_field = serializers.FileField(
+            allow_empty_file=False, validators=(ImageValidator(),))
+        album = self.context['album']
+        results = []
+        for index, file in enumerate(data['images']):
+            result = {'index': index, 'name': file.name}
+            try:
+                image = image_field.run_validation(file)
+            except serializers.ValidationError as exc:
+                result['errors'] = exc.detail
+            else:
+                result['photo'] = AlbumPhoto(
+                    album=album, image=image,
+                    phash=images.perceptual_hash(image))
+            results.append(result)
+        self.check_duplicates(results)
+        return {'images': self.check_quota(
+            results, settings.ALBUM_PHOTOS_LIMIT - album.photo_count)}
+
+    def check_duplicates(self, results):
+        """Flag or reject near duplicates of photos in the album."""
+        distance = settings.ALBUM_PHOTO_DUPLICATE_DISTANCE
+        photos = [result['photo'] for result in results if 'photo' in result]
+        found = self.context['album'].images.near_duplicates(
+            [photo.phash for photo in photos], distance)
+        accepted = []
+        for result in results:
+            photo = result.get('photo')
+            if photo is None:
+                continue
+            photo.duplicate_of = found.get(photo.phash)
+            if settings.ALBUM_PHOTO_REJECT_DUPLICATES and (
+                    photo.duplicate_of is not None or
+                    photo.phash is not None and any(
+                        (photo.phash ^ other).bit_count() <= distance
+                        for other in accepted)):
+                del result['photo']
+                result['errors'] = [duplicate_msg()]
+            elif photo.phash is not None:
+                accepted.append(photo.phash)
+
+    def create(self, validated_data):
+        """Insert the accepted photos under a lock on the album's row."""
+        album = self.context['album']
+        with transaction.atomic():
+            # Slots may have been taken since validation.
+            results = self.check_quota(
+                validated_data['images'], Album.objects.photo_slots(album.pk))
+            photos = [
+                result['photo'] for result in results if 'photo' in result]
+            AlbumPhoto.store_images(photos)
+            AlbumPhoto.objects.bulk_create(photos)
+            # bulk_create() sends no post_save, count the photos here.
+            Album.objects.filter(pk=album.pk).update(
+                photo_count=F('photo_count') + len(photos),
+                updated_at=timezone.now())
+            schedule_derivatives(photo.pk for photo in photos)
+        return results
+
+    def check_quota(self, results, remaining):
+        """Reject photos past the remaining slots, fail the batch if needed."""
+        for result in results:
+            if 'photo' not in result:
+                continue
+            if remaining > 0:
+                remaining -= 1
+            else:
+                del result['photo']
+                result['errors'] = [photo_quota_msg()]
+
+        if not any('photo' in result for result in results) or (
+                not self.context.get('partial') and
+                any('errors' in result for result in results)):
+            raise serializers.ValidationError({'images': [
+                {key: value for key, value in result.items()
+                 if key != 'photo'}
+                for result in results
+            ]})
+        return results
+
+
+class PhotoUploadSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = PhotoUpload
+        fields = ('id', 'album', 'filename', 'size', 'offset', 'created_at')
+
+    def validate_album(self, album):
+        """Check the album owner and that the album has a free slot."""
+        if album.owner_id != self.context['request'].user.pk:
+            raise serializers.ValidationError(_('Wrong album.'))
+        if album.photo_count >= settings.ALBUM_PHOTOS_LIMIT:
+            raise serializers.ValidationError(photo_quota_msg())
+        return album
+
+    def validate_size(self, size):
+        if not 0 < size <= settings.PHOTO_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(_('Max image file is 1MB'))
+        return size
+
+    def create(self, validated_data):
+        """Create the upload and its empty file."""
+        upload = super().create(validated_data)
+        os.makedirs(settings.PHOTO_UPLOAD_DIR, exist_ok=True)
+        open(upload.path, 'xb').close()
+        return upload
 
 
 class AlbumDetailSerializer(AlbumSerializer):
     images = AlbumPhotoSerializer(many=True, read_only=True)
+
+    class Meta(AlbumSerializer.Meta):
+        fields = (
+            'id', 'owner', 'likes', 'liked_by_me', 'images', 'title',
+            'created_date')
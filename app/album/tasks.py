@@ -0,0 +1,65 @@
+import os
+from datetime import timedelta
+
+from celery import shared_task
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache as album_cache
+
+from core import images
+from core.models import Album, AlbumPhoto, ImageStatus, PhotoUpload
+
+
+def schedule_derivatives(photo_pks):
+    """Queue derivative rendering once the photos are committed."""
+    photo_pks = list(photo_pks)
+    transaction.on_commit(
+        lambda: [make_photo_derivatives.delay(pk) for pk in photo_pks])
+
+
+@shared_task
+def make_photo_derivatives(photo_pk):
+    """Render resized copies of a photo and store them next to it."""
+    photo = AlbumPhoto.objects.filter(pk=photo_pk).first()
+    if photo is None or not photo.image:
+        return None
+
+    sizes = {}
+    try:
+        with photo.image.open('rb') as image_file:
+            derivatives = images.render(image_file.read())
+    except (OSError, ValueError, Image.DecompressionBombError):
+        status = ImageStatus.FAILED
+    else:
+        status = ImageStatus.READY
+        storage = photo.image.storage
+        base = os.path.splitext(photo.image.name)[0]
+        for name, extension, content, width, height in derivatives:
+            size = sizes.setdefault(name, {'width': width, 'height': height})
+            size[extension] = storage.save(
+                f'{base}_{name}.{extension}', ContentFile(content))
+
+    with transaction.atomic():
+        updated = AlbumPhoto.objects.filter(pk=photo_pk).update(
+            status=status, sizes=sizes)
+        Album.objects.filter(pk=photo.album_id).touch()
+    if not updated:
+        # The photo was deleted meanwhile, nothing references the files.
+        for name in images.derivative_names(sizes):
+            photo.image.storage.delete(name)
+    album_cache.invalidate(photo.album_id)
+    return status
+
+
+@shared_task
+def expire_photo_uploads():
+    """Delete uploads that were not finalized in time, with their files."""
+    expired = timezone.now() - timedelta(
+        seconds=settings.PHOTO_UPLOAD_EXPIRY)
+    deleted, _ = PhotoUpload.objects.filter(created_at__lt=expired).delete()
+    return deleted
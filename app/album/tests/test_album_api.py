@@ -1,24 +1,43 @@
+from io import StringIO
+from unittest.mock import patch
+import json
 import tempfile
 import shutil
 import os
+from urllib.parse import parse_qsl, urlparse
 
 from PIL import Image
 
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework import status
 
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Exists, OuterRef
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from core.tests.test_models import (
     sample_user,
     sample_album,
-    sample_album_photo
+    sample_album_photo,
+    sample_album_like
 )
-from core.models import Album
-from album.serializers import AlbumSerializer, AlbumDetailSerializer
+from core.models import Album, AlbumLike
+from core.tests.test_images import pattern_bytes
+from album.serializers import (
+    AlbumListRepresentation,
+    AlbumSerializer,
+    AlbumDetailSerializer
+)
+from album.views import CustomCursorPaginator
 
 ALBUM_LIST_URL = reverse('album:album-list')
+ALBUM_PHOTOS_LIMIT = settings.ALBUM_PHOTOS_LIMIT
 
 
 def get_detail_album_url(pk):
@@ -33,6 +52,18 @@ def upload_photo_url(pk):
     return reverse('album:album-upload-photo', args=[pk])
 
 
+def upload_photos_url(pk):
+    return reverse('album:album-upload-photos', args=[pk])
+
+
+def sample_image_file(suffix='.png', image_format='png', size=(200, 200)):
+    image_file = tempfile.NamedTemporaryFile(suffix=suffix)
+    img = Image.new('RGB', size)
+    img.save(image_file, image_format)
+    image_file.seek(0)
+    return image_file
+
+
 def delete_photo_url(pk, photo_pk):
     return reverse('album:album-delete-photo', args=[pk, photo_pk])
 
@@ -59,6 +90,9 @@ class AlbumViewSetTests(APITestCase):
         path = '/vol/web/media/uploads/albums/test@email.com'
         if os.path.exists(path):
             shutil.rmtree(path)
+        # Blob files stay behind when the test transaction rolls back.
+        shutil.rmtree(
+            '/vol/web/media/uploads/albums/blobs', ignore_errors=True)
 
     def test_retrieve_album_list(self):
         sample_album(owner=self.user, title='testalbum')
@@ -80,6 +114,45 @@ class AlbumViewSetTests(APITestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data['id'], serializer.data['id'])
 
+    def test_retrieve_album_conditional_headers(self):
+        url = get_detail_album_url(self.album.pk)
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.has_header('ETag'))
+        self.assertTrue(res.has_header('Last-Modified'))
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(
+                url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(
+            not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], res['ETag'])
+
+        not_modified = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+        self.assertEqual(
+            not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_album_etag_changes(self):
+        self.client.force_authenticate(self.user)
+        url = get_detail_album_url(self.album.pk)
+        etag = self.client.get(url)['ETag']
+
+        self.client.post(like_album_url(self.album.pk))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        etag = res['ETag']
+
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            photo = sample_album_photo(
+                album=self.album, image=image_file.name)
+        self.client.delete(delete_photo_url(self.album.pk, photo.pk))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
     def test_album_create_unauthenticated(self):
         payload = {
             'title': 'testalbumtitle'
@@ -115,6 +188,27 @@ class AlbumViewSetTests(APITestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_album_rechecks_quota_under_lock(self):
+        self.client.force_authenticate(user=self.user)
+
+        # The authenticated user row is stale, the locked read is not.
+        with patch('core.models.UserManager.album_slots', return_value=0):
+            res = self.client.post(ALBUM_LIST_URL, {'title': 'testalbum'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Album.objects.filter(owner=self.user).count(), 1)
+
+    def test_update_album_with_full_quota(self):
+        self.client.force_authenticate(user=self.user)
+        for i in range(settings.ALBUM_LIMIT - 1):
+            sample_album(owner=self.user, title=f'testalbum{i}')
+        self.user.refresh_from_db()
+
+        res = self.client.patch(
+            get_detail_album_url(self.album.pk), {'title': 'newtitle'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_album_permission(self):
         self.client.force_authenticate(user=self.user)
         sample_album(owner=self.user, title='testalbum1')
@@ -172,23 +266,191 @@ class AlbumViewSetTests(APITestCase):
         res = self.client.get(ALBUM_LIST_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn('results', res.data)
-        self.assertIn('count', res.data)
+        self.assertNotIn('count', res.data)
+        self.assertEqual(len(res.data['results']), 20)
         self.assertTrue(res.data['next'])
         self.assertFalse(res.data['previous'])
         # Check next page
         res = self.client.get(res.data['next'])
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn('results', res.data)
-        self.assertIn('count', res.data)
+        self.assertEqual(len(res.data['results']), 20)
         self.assertTrue(res.data['next'])
         self.assertTrue(res.data['previous'])
         # Check last page
         res = self.client.get(res.data['next'])
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn('results', res.data)
-        self.assertIn('count', res.data)
+        self.assertEqual(len(res.data['results']), 20)
         self.assertFalse(res.data['next'])
         self.assertTrue(res.data['previous'])
+        # Check previous page
+        res = self.client.get(res.data['previous'])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 20)
+        self.assertTrue(res.data['next'])
+
+    def test_pagination_cursor_is_keyed_on_id(self):
+        albums = [
+            sample_album(owner=self.user, title=f'testalbum{_}')
+            for _ in range(5)
+        ]
+        res = self.client.get(ALBUM_LIST_URL, {'page_size': 2})
+        self.assertEqual(
+            [album['id'] for album in res.data['results']],
+            [albums[4].id, albums[3].id])
+        # Albums created in the meantime do not shift the next page.
+        sample_album(owner=self.user, title='newalbum')
+        res = self.client.get(res.data['next'])
+        self.assertEqual(
+            [album['id'] for album in res.data['results']],
+            [albums[2].id, albums[1].id])
+
+    def test_pagination_max_page_size(self):
+        for _ in range(3):
+            sample_album(owner=self.user, title=f'testalbum{_}')
+
+        with patch.object(CustomCursorPaginator, 'max_page_size', 2):
+            res = self.client.get(ALBUM_LIST_URL, {'page_size': 1000})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_pagination_invalid_cursor(self):
+        res = self.client.get(ALBUM_LIST_URL, {'cursor': 'invalid'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_representation_matches_serializer(self):
+        album = sample_album(
+            owner=self.user, title='zażółć "album"', like_count=1)
+        sample_album_like(album=album, user_liked=self.user)
+        queryset = Album.objects.select_related('owner').annotate(
+            liked_by_me=Exists(AlbumLike.objects.filter(
+                album=OuterRef('pk'), user_liked=self.user))
+        ).order_by('-id')
+        representation = AlbumListRepresentation()
+        renderer = JSONRenderer()
+
+        self.assertEqual(
+            renderer.render(
+                representation.to_representation(
+                    representation.values(queryset))),
+            renderer.render(AlbumSerializer(queryset, many=True).data))
+
+    def test_list_response_matches_serializer(self):
+        sample_album(owner=self.user, title='testalbum', like_count=3)
+        serializer = AlbumSerializer(
+            Album.objects.order_by('-id'), many=True)
+
+        res = self.client.get(ALBUM_LIST_URL, {'page_size': 1000})
+
+        self.assertEqual(
+            json.loads(res.content)['results'],
+            json.loads(JSONRenderer().render(serializer.data)))
+
+    def test_benchmark_album_list_command(self):
+        out = StringIO()
+
+        call_command('benchmark_album_list', rows=10, repeat=1, stdout=out)
+
+        self.assertIn('byte-identical', out.getvalue())
+
+    @override_settings(ALBUM_STREAM_CHUNK_SIZE=2)
+    def test_stream_album_list(self):
+        for _ in range(4):
+            sample_album(owner=self.user, title=f'testalbum{_}')
+        serializer = AlbumSerializer(
+            Album.objects.all().order_by('-id'), many=True)
+
+        res = self.client.get(ALBUM_LIST_URL, {'stream': 'true'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        content = json.loads(b''.join(res.streaming_content))
+        self.assertEqual(content, {
+            'next': None,
+            'previous': None,
+            'results': json.loads(json.dumps(serializer.data)),
+        })
+
+    @override_settings(ALBUM_STREAM_CHUNK_SIZE=2)
+    def test_stream_album_list_pages(self):
+        for _ in range(4):
+            sample_album(owner=self.user, title=f'testalbum{_}')
+
+        def query(url):
+            return url and dict(parse_qsl(urlparse(url).query))
+
+        params = {'page_size': 3, 'stream': '1'}
+        while params:
+            res = self.client.get(ALBUM_LIST_URL, params)
+            content = json.loads(b''.join(res.streaming_content))
+            del params['stream']
+            expected = self.client.get(ALBUM_LIST_URL, params).json()
+
+            self.assertEqual(content['results'], expected['results'])
+            for link in ('next', 'previous'):
+                self.assertEqual(
+                    query(content[link]),
+                    query(expected[link]) and {
+                        **query(expected[link]), 'stream': '1'})
+            params = query(content['next'])
+
+    def test_stream_album_list_page_size_is_capped(self):
+        with patch.object(CustomCursorPaginator, 'max_page_size', 2):
+            for _ in range(3):
+                sample_album(owner=self.user, title=f'testalbum{_}')
+
+            res = self.client.get(
+                ALBUM_LIST_URL, {'stream': '1', 'page_size': 10})
+
+        content = json.loads(b''.join(res.streaming_content))
+        self.assertEqual(len(content['results']), 2)
+        self.assertIsNotNone(content['next'])
+
+    def test_stream_album_list_with_fields(self):
+        res = self.client.get(
+            ALBUM_LIST_URL, {'stream': '1', 'fields': 'id'})
+
+        content = json.loads(b''.join(res.streaming_content))
+        self.assertEqual(content['results'], [{'id': self.album.id}])
+
+    def test_stream_empty_album_list(self):
+        self.album.delete()
+
+        res = self.client.get(ALBUM_LIST_URL, {'stream': 'true'})
+
+        self.assertEqual(
+            json.loads(b''.join(res.streaming_content)),
+            {'next': None, 'previous': None, 'results': []})
+
+    def test_album_list_liked_by_me(self):
+        liked = sample_album(owner=self.user, title='liked')
+        sample_album_like(album=liked, user_liked=self.user)
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ALBUM_LIST_URL)
+
+        self.assertEqual(
+            [album['liked_by_me'] for album in res.data['results']],
+            [True, False])
+
+    def test_album_detail_liked_by_me(self):
+        self.client.force_authenticate(self.user)
+        url = get_detail_album_url(self.album.pk)
+        self.assertFalse(self.client.get(url).data['liked_by_me'])
+
+        self.client.post(like_album_url(self.album.pk))
+
+        self.assertTrue(self.client.get(url).data['liked_by_me'])
+
+    def test_album_list_liked_by_me_unauthenticated(self):
+        res = self.client.get(ALBUM_LIST_URL)
+
+        self.assertNotIn('liked_by_me', res.data['results'][0])
 
     def test_like_an_album_unauthenticated(self):
         res = self.client.post(like_album_url(self.album.pk))
@@ -202,11 +464,13 @@ class AlbumViewSetTests(APITestCase):
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         self.album.refresh_from_db()
         self.assertEqual(self.album.likes.count(), 1)
+        self.assertEqual(self.album.like_count, 1)
         # Try create like while already liked.
         res = self.client.post(like_album_url(self.album.pk))
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         self.album.refresh_from_db()
         self.assertEqual(self.album.likes.count(), 1)
+        self.assertEqual(self.album.like_count, 1)
 
     def test_like_other_users_albums(self):
         self.client.force_authenticate(self.user)
@@ -226,6 +490,16 @@ class AlbumViewSetTests(APITestCase):
         album2.refresh_from_db()
         self.assertEqual(album2.likes.count(), 1)
 
+    def test_album_likes_field(self):
+        self.album.like_count = 5
+        self.album.save()
+
+        res = self.client.get(get_detail_album_url(self.album.pk))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['likes'], 5)
+        self.assertNotIn('like_count', res.data)
+
     def test_dislike_an_album_unauthenticated(self):
         res = self.client.delete(like_album_url(self.album.pk))
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -243,6 +517,7 @@ class AlbumViewSetTests(APITestCase):
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.album.refresh_from_db()
         self.assertEqual(self.album.likes.count(), 0)
+        self.assertEqual(self.album.like_count, 0)
         # Try dislike already disliked.
         res = self.client.delete(like_album_url(self.album.pk))
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -307,6 +582,22 @@ class AlbumViewSetTests(APITestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(self.album.images.count(), 0)
 
+    def test_upload_photo_too_large_rejected_while_streaming(self):
+        self.client.force_authenticate(user=self.user)
+        url = upload_photo_url(self.album.pk)
+
+        for size in (1024 * 1024 + 1, 50 * 1024 * 1024):
+            with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+                Image.new('RGB', (200, 200)).save(image_file, 'png')
+                image_file.truncate(size)
+                image_file.seek(0)
+                res = self.client.post(
+                    url, {'image': image_file}, format='multipart')
+
+            self.assertEqual(
+                res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(self.album.images.count(), 0)
+
     def test_upload_photo_gif_ext(self):
         self.client.force_authenticate(user=self.user)
         url = upload_photo_url(self.album.pk)
@@ -323,6 +614,28 @@ class AlbumViewSetTests(APITestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(self.album.images.count(), 0)
 
+    @override_settings(IMAGE_MAX_PIXELS=200 * 200 - 1)
+    def test_upload_photo_over_pixel_budget(self):
+        self.client.force_authenticate(user=self.user)
+
+        res = self.client.post(
+            upload_photo_url(self.album.pk), {'image': sample_image_file()},
+            format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.album.images.count(), 0)
+
+    def test_upload_photo_renamed_gif(self):
+        self.client.force_authenticate(user=self.user)
+        image_file = sample_image_file(suffix='.png', image_format='gif')
+
+        res = self.client.post(
+            upload_photo_url(self.album.pk), {'image': image_file},
+            format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.album.images.count(), 0)
+
     def test_upload_photo_not_allowed_methods(self):
         self.client.force_authenticate(user=self.user)
         url = upload_photo_url(self.album.pk)
@@ -362,6 +675,167 @@ class AlbumViewSetTests(APITestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(self.album.images.count(), 10)
 
+    def test_upload_photos(self):
+        self.client.force_authenticate(user=self.user)
+        images = [sample_image_file() for _ in range(3)]
+
+        res = self.client.post(
+            upload_photos_url(self.album.pk), {'images': images},
+            format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.album.images.count(), 3)
+        self.assertEqual(
+            [result['id'] for result in res.data['results']],
+            list(self.album.images.order_by('id').values_list(
+                'id', flat=True)))
+        self.assertEqual(
+            [result['index'] for result in res.data['results']], [0, 1, 2])
+
+    def upload_pattern(self, seed, **params):
+        image = SimpleUploadedFile(
+            'image.jpg', pattern_bytes(seed, image_format='jpeg', **params))
+        return self.client.post(
+            upload_photo_url(self.album.pk), {'image': image},
+            format='multipart')
+
+    def test_upload_photo_flags_near_duplicate(self):
+        self.client.force_authenticate(user=self.user)
+        first = self.upload_pattern(1, quality=90)
+
+        res = self.upload_pattern(1, quality=40)
+        other = self.upload_pattern(2)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['duplicate_of'], first.data['id'])
+        self.assertIsNone(first.data['duplicate_of'])
+        self.assertIsNone(other.data['duplicate_of'])
+
+    @override_settings(ALBUM_PHOTO_REJECT_DUPLICATES=True)
+    def test_upload_photo_rejects_near_duplicate(self):
+        self.client.force_authenticate(user=self.user)
+        self.upload_pattern(1, quality=90)
+
+        res = self.upload_pattern(1, size=(600, 400))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+        self.assertEqual(self.album.images.count(), 1)
+
+    @override_settings(ALBUM_PHOTO_REJECT_DUPLICATES=True)
+    def test_upload_photos_rejects_near_duplicates(self):
+        self.client.force_authenticate(user=self.user)
+        self.upload_pattern(1)
+        images = [
+            SimpleUploadedFile(f'image{index}.jpg', pattern_bytes(
+                seed, image_format='jpeg', quality=quality))
+            for index, (seed, quality) in enumerate(
+                ((1, 60), (2, 90), (2, 50), (3, 90)))
+        ]
+
+        res = self.client.post(
+            upload_photos_url(self.album.pk) + '?partial=1',
+            {'images': images}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            ['errors' in result for result in res.data['results']],
+            [True, False, True, False])
+        self.assertEqual(self.album.images.count(), 3)
+
+    def test_upload_photos_is_all_or_nothing(self):
+        self.client.force_authenticate(user=self.user)
+        images = [
+            sample_image_file(),
+            sample_image_file(suffix='.gif', image_format='gif'),
+        ]
+
+        res = self.client.post(
+            upload_photos_url(self.album.pk), {'images': images},
+            format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.album.images.count(), 0)
+        results = res.data['images']
+        self.assertNotIn('errors', results[0])
+        self.assertIn('errors', results[1])
+
+    def test_upload_photos_partial(self):
+        self.client.force_authenticate(user=self.user)
+        images = [
+            sample_image_file(suffix='.gif', image_format='gif'),
+            sample_image_file(),
+        ]
+
+        res = self.client.post(
+            upload_photos_url(self.album.pk) + '?partial=1',
+            {'images': images}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(self.album.images.count(), 1)
+        results = res.data['results']
+        self.assertIn('errors', results[0])
+        self.assertEqual(
+            results[1]['id'], self.album.images.get().pk)
+
+    def test_upload_photos_over_quota(self):
+        self.client.force_authenticate(user=self.user)
+        for i in range(ALBUM_PHOTOS_LIMIT - 1):
+            sample_album_photo(album=self.album, image=f'image{i}.png')
+        images = [sample_image_file() for _ in range(2)]
+        url = upload_photos_url(self.album.pk)
+
+        res = self.client.post(url, {'images': images}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.album.images.count(), ALBUM_PHOTOS_LIMIT - 1)
+
+        for image in images:
+            image.seek(0)
+        res = self.client.post(
+            url + '?partial=true', {'images': images}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(self.album.images.count(), ALBUM_PHOTOS_LIMIT)
+        self.assertIn('errors', res.data['results'][1])
+
+    def test_upload_photos_rechecks_quota_under_lock(self):
+        self.client.force_authenticate(user=self.user)
+        images = [sample_image_file() for _ in range(2)]
+        url = upload_photos_url(self.album.pk)
+
+        # Another request takes the slots between validation and insert.
+        with patch(
+                'core.models.AlbumQuerySet.photo_slots', return_value=1):
+            res = self.client.post(
+                url + '?partial=1', {'images': images}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(self.album.images.count(), 1)
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.photo_count, 1)
+
+    def test_upload_photos_without_files(self):
+        self.client.force_authenticate(user=self.user)
+
+        res = self.client.post(
+            upload_photos_url(self.album.pk), {}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_photos_not_owner(self):
+        other_user = sample_user(
+            email='other@email.com', name='othername',
+            password='TestPassword!123')
+        self.client.force_authenticate(user=other_user)
+
+        res = self.client.post(
+            upload_photos_url(self.album.pk),
+            {'images': [sample_image_file()]}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.album.images.count(), 0)
+
     def test_delete_photo_is_owner(self):
         self.client.force_authenticate(user=self.user)
 
@@ -440,3 +914,160 @@ class AlbumViewSetTests(APITestCase):
         url = delete_photo_url(self.album.pk, album_photo.pk)
         res = self.client.patch(url)
         self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+@override_settings(
+    SUSPEND_SIGNALS=True,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+)
+class AlbumQueryBudgetTests(APITestCase):
+    """Each action runs a fixed number of queries regardless of data size."""
+
+    def setUp(self):
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+        self.album = sample_album(owner=self.user, title='images_album')
+
+    def tearDown(self):
+        path = '/vol/web/media/uploads/albums/test@email.com'
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        # Blob files stay behind when the test transaction rolls back.
+        shutil.rmtree(
+            '/vol/web/media/uploads/albums/blobs', ignore_errors=True)
+
+    def populate(self, number_of_albums):
+        first = Album.objects.count()
+        for i in range(first, first + number_of_albums):
+            owner = sample_user(
+                email=f'test{i}@email.com', name=f'testname{i}',
+                password='TestPassword!123')
+            album = sample_album(owner=owner, title=f'testalbum{i}')
+            sample_album_like(album=album, user_liked=self.user)
+            sample_album_photo(album=album, image=f'image{i}.png')
+
+    def test_list_query_budget(self):
+        for number_of_albums, page_size in ((2, 5), (30, 50)):
+            self.populate(number_of_albums)
+            with self.assertNumQueries(1):
+                res = self.client.get(
+                    ALBUM_LIST_URL, {'page_size': page_size})
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_query_budget(self):
+        for i in range(ALBUM_PHOTOS_LIMIT):
+            sample_album_photo(album=self.album, image=f'image{i}.png')
+        self.populate(3)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(get_detail_album_url(self.album.pk))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['images']), ALBUM_PHOTOS_LIMIT)
+
+    def test_like_album_query_budget(self):
+        self.populate(3)
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(5):
+            res = self.client.post(like_album_url(self.album.pk))
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(5):
+            res = self.client.delete(like_album_url(self.album.pk))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_upload_photos_query_budget(self):
+        self.client.force_authenticate(self.user)
+        # Identical images, the second batch reuses the stored blob.
+        for number_of_images, queries in ((1, 11), (5, 9)):
+            images = [
+                sample_image_file() for _ in range(number_of_images)]
+            with self.assertNumQueries(queries):
+                res = self.client.post(
+                    upload_photos_url(self.album.pk), {'images': images},
+                    format='multipart')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_delete_photo_query_budget(self):
+        photo = sample_album_photo(album=self.album, image='image.png')
+        self.populate(3)
+        self.client.force_authenticate(self.user)
+
+        # Photos flagged as its near duplicates are unlinked.
+        with self.assertNumQueries(5):
+            res = self.client.delete(
+                delete_photo_url(self.album.pk, photo.pk))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+
+@override_settings(
+    SUSPEND_SIGNALS=True,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+)
+class AlbumSparseFieldsTests(APITestCase):
+
+    def setUp(self):
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+        self.album = sample_album(owner=self.user, title='images_album')
+        sample_album_photo(album=self.album, image='image.png')
+
+    def test_list_fields(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(ALBUM_LIST_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'],
+            [{'id': self.album.id, 'title': self.album.title}])
+
+    def test_list_fields_without_owner_skip_join(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(ALBUM_LIST_URL, {'fields': 'title,likes'})
+
+        self.assertNotIn('core_user', queries[0]['sql'])
+
+    def test_list_expand_images(self):
+        with self.assertNumQueries(2):
+            res = self.client.get(ALBUM_LIST_URL, {'expand': 'images'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results'][0]['images']), 1)
+        self.assertIn('owner', res.data['results'][0])
+
+    def test_list_without_expand_has_no_images(self):
+        res = self.client.get(ALBUM_LIST_URL)
+
+        self.assertNotIn('images', res.data['results'][0])
+
+    def test_retrieve_fields_without_images(self):
+        url = get_detail_album_url(self.album.pk)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(url, {'fields': 'id,owner'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data, {'id': self.album.id, 'owner': self.user.email})
+
+    def test_unknown_fields(self):
+        res = self.client.get(ALBUM_LIST_URL, {'fields': 'id,password'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
+
+        res = self.client.get(
+            get_detail_album_url(self.album.pk), {'expand': 'owner'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expand', res.data)
@@ -0,0 +1,101 @@
+import io
+import zipfile
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from album.archive import stream_zip
+from core.tests.test_models import (
+    sample_user,
+    sample_album,
+    sample_album_photo
+)
+
+
+def download_url(pk):
+    return reverse('album:album-download', args=[pk])
+
+
+class StreamZipTests(SimpleTestCase):
+
+    def test_archive_of_stored_entries(self):
+        files = {'a.png': b'a' * 100_000, 'b.png': b'', 'c.jpeg': b'c' * 10}
+
+        chunks = list(stream_zip(
+            ((name, io.BytesIO(content)) for name, content in files.items()),
+            (2023, 1, 2, 3, 4, 6), chunk_size=1024))
+
+        self.assertTrue(all(chunks))
+        self.assertLessEqual(max(map(len, chunks)), 2048)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), list(files))
+            for info in archive.infolist():
+                self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+                self.assertEqual(info.date_time, (2023, 1, 2, 3, 4, 6))
+                self.assertEqual(archive.read(info), files[info.filename])
+
+    def test_stops_opening_files_when_closed(self):
+        opened = []
+
+        def entries():
+            for index in range(3):
+                opened.append(index)
+                yield f'{index}.png', io.BytesIO(b'x' * 10)
+
+        stream = stream_zip(entries(), (2023, 1, 1, 0, 0, 0), chunk_size=4)
+        next(stream)
+        stream.close()
+
+        self.assertEqual(opened, [0])
+
+
+@override_settings(SUSPEND_SIGNALS=True)
+class AlbumDownloadTests(APITestCase):
+
+    def setUp(self):
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+        self.album = sample_album(owner=self.user, title='album')
+
+    def sample_photo(self, content):
+        name = default_storage.save(
+            'uploads/albums/test/photo.png', ContentFile(content))
+        self.addCleanup(default_storage.delete, name)
+        return sample_album_photo(album=self.album, image=name)
+
+    def test_download_album(self):
+        photos = [self.sample_photo(bytes([i]) * 1000) for i in range(3)]
+        sample_album_photo(album=self.album, image='missing.png')
+
+        res = self.client.get(download_url(self.album.pk))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/zip')
+        self.assertEqual(
+            res['Content-Disposition'],
+            f'attachment; filename="album-{self.album.pk}.zip"')
+        content = b''.join(res.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertEqual(
+                archive.namelist(), [f'{photo.pk}.png' for photo in photos])
+            self.assertEqual(
+                archive.read(f'{photos[1].pk}.png'), bytes([1]) * 1000)
+
+    def test_download_empty_album(self):
+        res = self.client.get(download_url(self.album.pk))
+
+        content = b''.join(res.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertEqual(archive.namelist(), [])
+
+    def test_download_missing_album(self):
+        res = self.client.get(download_url(self.album.pk + 1))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
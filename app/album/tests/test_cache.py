@@ -0,0 +1,190 @@
+from unittest.mock import patch
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from core.models import Album
+from core.tests.test_models import (
+    sample_user,
+    sample_album,
+    sample_album_photo
+)
+from album import cache as album_cache
+from album.views import AlbumAPIViewSet
+from album.tests.test_album_api import (
+    ALBUM_LIST_URL,
+    get_detail_album_url,
+    like_album_url,
+    delete_photo_url
+)
+
+
+@override_settings(
+    SUSPEND_SIGNALS=True,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    },
+)
+class AlbumCacheTests(APITestCase):
+
+    def setUp(self):
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+        self.album = sample_album(owner=self.user, title='images_album')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_anonymous_list_served_from_cache(self):
+        res = self.client.get(ALBUM_LIST_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(ALBUM_LIST_URL)
+
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.data, res.data)
+
+    def test_anonymous_detail_served_from_cache(self):
+        url = get_detail_album_url(self.album.pk)
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+
+        self.assertEqual(cached.data, res.data)
+
+    def test_cached_detail_answers_conditional_requests(self):
+        url = get_detail_album_url(self.album.pk)
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_not_found_is_not_cached(self):
+        url = get_detail_album_url(self.album.pk + 1)
+        self.client.get(url)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_authenticated_reads_skip_cache(self):
+        self.client.get(ALBUM_LIST_URL)
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            self.client.get(ALBUM_LIST_URL)
+
+    def test_query_string_is_part_of_the_key(self):
+        sample_album(owner=self.user, title='second_album')
+        self.client.get(ALBUM_LIST_URL)
+
+        res = self.client.get(ALBUM_LIST_URL, {'page_size': 1})
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_write_while_building_response_is_not_cached_stale(self):
+        url = get_detail_album_url(self.album.pk)
+        fast_list = AlbumAPIViewSet.fast_list
+        retrieve = AlbumAPIViewSet.conditional_retrieve
+
+        def list_then_write(view, *args, **kwargs):
+            response = fast_list(view, *args, **kwargs)
+            album_cache.invalidate()
+            return response
+
+        def retrieve_then_write(view, *args, **kwargs):
+            response = retrieve(view, *args, **kwargs)
+            album_cache.invalidate(self.album.pk)
+            return response
+
+        with patch.object(AlbumAPIViewSet, 'fast_list', list_then_write), \
+                patch.object(AlbumAPIViewSet, 'conditional_retrieve',
+                             retrieve_then_write):
+            self.client.get(ALBUM_LIST_URL)
+            self.client.get(url)
+
+        # The write happened after the responses were built from the row.
+        Album.objects.filter(pk=self.album.pk).update(title='changed')
+        res = self.client.get(ALBUM_LIST_URL)
+        self.assertEqual(res.data['results'][0]['title'], 'changed')
+        res = self.client.get(url)
+        self.assertEqual(res.data['title'], 'changed')
+
+    def test_create_invalidates_list(self):
+        self.client.get(ALBUM_LIST_URL)
+        self.client.force_authenticate(self.user)
+        self.client.post(ALBUM_LIST_URL, {'title': 'new_album'})
+        self.client.force_authenticate(None)
+
+        res = self.client.get(ALBUM_LIST_URL)
+
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_update_invalidates_list_and_detail(self):
+        url = get_detail_album_url(self.album.pk)
+        self.client.get(ALBUM_LIST_URL)
+        self.client.get(url)
+        self.client.force_authenticate(self.user)
+        self.client.patch(url, {'title': 'new_title'})
+        self.client.force_authenticate(None)
+
+        self.assertEqual(self.client.get(url).data['title'], 'new_title')
+        self.assertEqual(
+            self.client.get(ALBUM_LIST_URL).data['results'][0]['title'],
+            'new_title')
+
+    def test_update_keeps_other_albums_cached(self):
+        other = sample_album(owner=self.user, title='other_album')
+        self.client.get(get_detail_album_url(other.pk))
+        self.client.force_authenticate(self.user)
+        self.client.patch(
+            get_detail_album_url(self.album.pk), {'title': 'new_title'})
+        self.client.force_authenticate(None)
+
+        with self.assertNumQueries(0):
+            self.client.get(get_detail_album_url(other.pk))
+
+    def test_destroy_invalidates_detail(self):
+        url = get_detail_album_url(self.album.pk)
+        self.client.get(url)
+        self.client.force_authenticate(self.user)
+        self.client.delete(url)
+        self.client.force_authenticate(None)
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_like_invalidates_list_and_detail(self):
+        url = get_detail_album_url(self.album.pk)
+        self.client.get(ALBUM_LIST_URL)
+        self.client.get(url)
+        self.client.force_authenticate(self.user)
+        self.client.post(like_album_url(self.album.pk))
+        self.client.force_authenticate(None)
+
+        self.assertEqual(self.client.get(url).data['likes'], 1)
+        self.assertEqual(
+            self.client.get(ALBUM_LIST_URL).data['results'][0]['likes'], 1)
+
+    def test_delete_photo_invalidates_detail(self):
+        photo = sample_album_photo(album=self.album, image='image.png')
+        url = get_detail_album_url(self.album.pk)
+        self.assertEqual(len(self.client.get(url).data['images']), 1)
+        self.client.force_authenticate(self.user)
+        self.client.delete(delete_photo_url(self.album.pk, photo.pk))
+        self.client.force_authenticate(None)
+
+        self.assertEqual(len(self.client.get(url).data['images']), 0)
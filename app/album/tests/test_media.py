@@ -0,0 +1,151 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, override_settings
+
+from album.views import parse_range
+from core.tests.test_models import (
+    sample_user,
+    sample_album,
+    sample_album_photo
+)
+
+
+def media_url(name):
+    return f'{settings.MEDIA_URL}{name}'
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-200', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-200', 100), (0, 99))
+
+    def test_ignored_ranges(self):
+        for header in ('', 'bytes=-', 'bytes=9-0', 'bytes=0-1,5-6', 'x=0-1'):
+            self.assertIsNone(parse_range(header, 100))
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=100-', 'bytes=-0'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 100)
+
+
+@override_settings(
+    SUSPEND_SIGNALS=True,
+    ALBUM_PHOTO_SIZES={'thumb': 100},
+    MEDIA_ACCEL='',
+)
+class MediaViewTests(APITestCase):
+
+    def setUp(self):
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+        self.album = sample_album(owner=self.user, title='album')
+        self.content = bytes(range(256)) * 4
+        self.name = self.save('uploads/albums/test/photo.png')
+        self.thumb = self.save('uploads/albums/test/photo_thumb.webp')
+        self.photo = sample_album_photo(
+            album=self.album, image=self.name,
+            sizes={'thumb': {'width': 100, 'height': 100,
+                             'webp': self.thumb}})
+
+    def save(self, name):
+        name = default_storage.save(name, ContentFile(self.content))
+        self.addCleanup(default_storage.delete, name)
+        return name
+
+    def test_serve_photo(self):
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+        self.assertEqual(res['Content-Type'], 'image/png')
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', res['Cache-Control'])
+
+    def test_serve_with_image_accept_header(self):
+        for accept in ('image/png', 'image/*'):
+            res = self.client.get(media_url(self.name), HTTP_ACCEPT=accept)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(b''.join(res.streaming_content), self.content)
+
+        res = self.client.get(
+            media_url('uploads/albums/test/missing.png'),
+            HTTP_ACCEPT='image/png')
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_serve_derivative(self):
+        res = self.client.get(media_url(self.thumb))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+
+    def test_serve_range(self):
+        res = self.client.get(media_url(self.name), HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), self.content[10:20])
+        self.assertEqual(res['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(res['Content-Length'], '10')
+
+    def test_unsatisfiable_range(self):
+        res = self.client.get(media_url(self.name), HTTP_RANGE='bytes=2000-')
+
+        self.assertEqual(
+            res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(res['Content-Range'], 'bytes */1024')
+
+    def test_unreferenced_file_not_served(self):
+        name = self.save('uploads/albums/test/orphan.png')
+
+        res = self.client.get(media_url(name))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_serve_user_image_but_not_raw_upload(self):
+        image = self.save('uploads/profile_pics/test/image.webp')
+        upload = self.save('uploads/profile_pics/test/upload.png')
+        self.user.image = image
+        self.user.image_upload = upload
+        self.user.save()
+
+        self.assertEqual(
+            self.client.get(media_url(image)).status_code,
+            status.HTTP_200_OK)
+        self.assertEqual(
+            self.client.get(media_url(upload)).status_code,
+            status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_ACCEL='nginx')
+    def test_x_accel_redirect(self):
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            f'{settings.MEDIA_ACCEL_PREFIX}{self.name}')
+        self.assertEqual(res.content, b'')
+        self.assertIn('immutable', res['Cache-Control'])
+
+    @override_settings(MEDIA_ACCEL='sendfile')
+    def test_x_sendfile(self):
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res['X-Sendfile'], default_storage.path(self.name))
+        self.assertEqual(res.content, b'')
+
+    def test_write_methods_not_allowed(self):
+        self.client.force_authenticate(self.user)
+
+        res = self.client.delete(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
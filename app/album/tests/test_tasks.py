@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from album.serializers import AlbumPhotoSerializer
+from album.tasks import make_photo_derivatives
+from core.models import AlbumPhoto, ImageStatus
+from core.tests.test_images import image_bytes
+from core.tests.test_models import sample_user, sample_album
+
+
+@override_settings(
+    SUSPEND_SIGNALS=True,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+    CELERY_TASK_ALWAYS_EAGER=True,
+    CELERY_TASK_EAGER_PROPAGATES=True,
+    ALBUM_PHOTO_SIZES={'thumb': 100, 'medium': 400},
+    ALBUM_PHOTO_FORMATS=('webp', 'jpeg'),
+    IMAGE_WORKERS=0,
+)
+class PhotoDerivativesTests(TestCase):
+
+    def setUp(self):
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+        self.album = sample_album(owner=self.user, title='album')
+
+    def tearDown(self):
+        path = '/vol/web/media/uploads/albums/test@email.com'
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        # Blob files stay behind when the test transaction rolls back.
+        shutil.rmtree(
+            '/vol/web/media/uploads/albums/blobs', ignore_errors=True)
+
+    def sample_photo(self, content=None):
+        content = content or image_bytes((800, 600))
+        return AlbumPhoto.objects.create(
+            album=self.album,
+            image=SimpleUploadedFile('image.png', content))
+
+    def test_make_photo_derivatives(self):
+        photo = self.sample_photo()
+
+        result = make_photo_derivatives.delay(photo.pk)
+
+        self.assertEqual(result.get(), ImageStatus.READY)
+        photo.refresh_from_db()
+        self.assertEqual(photo.status, ImageStatus.READY)
+        self.assertEqual(list(photo.sizes), ['thumb', 'medium'])
+        self.assertEqual(
+            (photo.sizes['thumb']['width'], photo.sizes['thumb']['height']),
+            (100, 75))
+        storage = photo.image.storage
+        for size in photo.sizes.values():
+            self.assertTrue(storage.exists(size['webp']))
+            self.assertTrue(storage.exists(size['jpeg']))
+
+    def test_make_photo_derivatives_invalid_image(self):
+        photo = self.sample_photo(content=b'not an image')
+
+        result = make_photo_derivatives.delay(photo.pk)
+
+        self.assertEqual(result.get(), ImageStatus.FAILED)
+        photo.refresh_from_db()
+        self.assertEqual(photo.status, ImageStatus.FAILED)
+        self.assertEqual(photo.sizes, {})
+
+    def test_photo_serializer_sizes_and_srcset(self):
+        photo = self.sample_photo()
+        make_photo_derivatives(photo.pk)
+        photo.refresh_from_db()
+
+        data = AlbumPhotoSerializer(photo).data
+
+        self.assertEqual(data['status'], 'ready')
+        thumb = data['sizes']['thumb']
+        self.assertTrue(thumb['webp'].endswith('_thumb.webp'))
+        self.assertEqual(
+            data['srcset']['webp'],
+            f"{thumb['webp']} 100w, {data['sizes']['medium']['webp']} 400w")
+
+    def test_delete_photo_deletes_derivatives(self):
+        photo = self.sample_photo()
+        make_photo_derivatives(photo.pk)
+        photo.refresh_from_db()
+        storage = photo.image.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.delete()
+
+        for size in photo.sizes.values():
+            self.assertFalse(storage.exists(size['webp']))
+
+    def test_queue_photo_derivatives_command(self):
+        photo = self.sample_photo()
+        failed = self.sample_photo(content=b'not an image')
+        AlbumPhoto.objects.filter(pk=failed.pk).update(
+            status=ImageStatus.FAILED)
+
+        call_command('queue_photo_derivatives', failed=True)
+
+        photo.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual(photo.status, ImageStatus.READY)
+        self.assertEqual(failed.status, ImageStatus.FAILED)
+
+
+@override_settings(
+    SUSPEND_SIGNALS=True,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+    CELERY_TASK_ALWAYS_EAGER=True,
+    CELERY_TASK_EAGER_PROPAGATES=True,
+    IMAGE_WORKERS=0,
+)
+class PhotoDerivativesAPITests(APITestCase):
+
+    def setUp(self):
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+        self.album = sample_album(owner=self.user, title='album')
+
+    def tearDown(self):
+        path = '/vol/web/media/uploads/albums/test@email.com'
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        # Blob files stay behind when the test transaction rolls back.
+        shutil.rmtree(
+            '/vol/web/media/uploads/albums/blobs', ignore_errors=True)
+
+    def test_upload_photo_renders_derivatives_after_commit(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('album:album-upload-photo', args=[self.album.pk])
+
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.new('RGB', (300, 300)).save(image_file, 'png')
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(
+                    url, {'image': image_file}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['status'], 'pending')
+        self.assertEqual(res.data['sizes'], {})
+
+        res = self.client.get(
+            reverse('album:album-detail', args=[self.album.pk]))
+        photo = res.data['images'][0]
+        self.assertEqual(photo['status'], 'ready')
+        self.assertIn('thumb', photo['sizes'])
+        self.assertTrue(photo['srcset']['jpeg'])
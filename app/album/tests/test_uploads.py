@@ -0,0 +1,225 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from album.tasks import expire_photo_uploads
+from core.models import AlbumPhoto, PhotoUpload
+from core.tests.test_images import image_bytes
+from core.tests.test_models import sample_user, sample_album
+
+UPLOADS_URL = reverse('album:photo-upload-list')
+CONTENT_TYPE = 'application/offset+octet-stream'
+
+
+def upload_url(pk):
+    return reverse('album:photo-upload-detail', args=[pk])
+
+
+def finalize_url(pk):
+    return reverse('album:photo-upload-finalize', args=[pk])
+
+
+@override_settings(
+    SUSPEND_SIGNALS=True,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+    CELERY_TASK_ALWAYS_EAGER=True,
+    ALBUM_PHOTO_SIZES={'thumb': 100},
+    IMAGE_WORKERS=0,
+)
+class PhotoUploadTests(APITestCase):
+
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_dir)
+        settings = self.settings(PHOTO_UPLOAD_DIR=self.upload_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+        self.album = sample_album(owner=self.user, title='album')
+        self.client.force_authenticate(self.user)
+        self.content = image_bytes((300, 200))
+
+    def tearDown(self):
+        path = '/vol/web/media/uploads/albums/test@email.com'
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        # Blob files stay behind when the test transaction rolls back.
+        shutil.rmtree(
+            '/vol/web/media/uploads/albums/blobs', ignore_errors=True)
+
+    def create_upload(self, **params):
+        payload = {
+            'album': self.album.pk,
+            'filename': 'image.png',
+            'size': len(self.content),
+        }
+        payload.update(params)
+        return self.client.post(UPLOADS_URL, payload)
+
+    def send_chunk(self, pk, offset, chunk):
+        return self.client.patch(
+            upload_url(pk), chunk, content_type=CONTENT_TYPE,
+            HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_create_upload(self):
+        res = self.create_upload()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['offset'], 0)
+        upload = PhotoUpload.objects.get(pk=res.data['id'])
+        self.assertTrue(os.path.exists(upload.path))
+
+    def test_create_upload_too_big(self):
+        res = self.create_upload(size=1024 * 1024 + 1)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('size', res.data)
+
+    def test_create_upload_someone_else_album(self):
+        user = sample_user(
+            email='other@email.com', name='other',
+            password='TestPassword!123')
+        self.client.force_authenticate(user)
+
+        res = self.create_upload()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('album', res.data)
+
+    def test_upload_in_chunks_and_finalize(self):
+        pk = self.create_upload().data['id']
+        half = len(self.content) // 2
+
+        res = self.send_chunk(pk, 0, self.content[:half])
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(res['Upload-Offset'], str(half))
+        res = self.send_chunk(pk, half, self.content[half:])
+        self.assertEqual(res['Upload-Offset'], str(len(self.content)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(finalize_url(pk))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        photo = AlbumPhoto.objects.get(pk=res.data['id'])
+        self.assertEqual(photo.album, self.album)
+        with photo.image.open('rb') as image:
+            self.assertEqual(image.read(), self.content)
+        self.assertFalse(PhotoUpload.objects.filter(pk=pk).exists())
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def test_resume_after_offset_mismatch(self):
+        pk = self.create_upload().data['id']
+        self.send_chunk(pk, 0, self.content[:100])
+
+        res = self.send_chunk(pk, 0, self.content[:100])
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Upload-Offset'], '100')
+
+        res = self.client.head(upload_url(pk))
+        self.assertEqual(res['Upload-Offset'], '100')
+        res = self.send_chunk(pk, 100, self.content[100:])
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        with open(PhotoUpload.objects.get(pk=pk).path, 'rb') as part:
+            self.assertEqual(part.read(), self.content)
+
+    def test_chunk_dropped_if_offset_moved_while_receiving(self):
+        pk = self.create_upload().data['id']
+        receive = PhotoUpload.receive
+
+        def receive_while_another_request_appends(upload, stream):
+            chunk_file = receive(upload, stream)
+            other = PhotoUpload.objects.get(pk=pk)
+            with receive(other, io.BytesIO(self.content[:100])) as other_file:
+                other.append(other_file)
+            return chunk_file
+
+        with patch.object(PhotoUpload, 'receive',
+                          receive_while_another_request_appends):
+            res = self.send_chunk(pk, 0, self.content[:50])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Upload-Offset'], '100')
+        upload = PhotoUpload.objects.get(pk=pk)
+        with open(upload.path, 'rb') as part:
+            self.assertEqual(part.read(), self.content[:100])
+        self.assertEqual(os.listdir(self.upload_dir), [f'{pk}.part'])
+
+    def test_chunk_bigger_than_size(self):
+        pk = self.create_upload(size=10).data['id']
+
+        res = self.send_chunk(pk, 0, b'x' * 11)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res['Upload-Offset'], '0')
+        self.assertEqual(os.path.getsize(PhotoUpload.objects.get(
+            pk=pk).path), 0)
+
+    def test_finalize_incomplete_upload(self):
+        pk = self.create_upload().data['id']
+        self.send_chunk(pk, 0, self.content[:100])
+
+        res = self.client.post(finalize_url(pk))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(AlbumPhoto.objects.exists())
+
+    def test_finalize_invalid_image(self):
+        pk = self.create_upload(size=10).data['id']
+        self.send_chunk(pk, 0, b'x' * 10)
+
+        res = self.client.post(finalize_url(pk))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+        self.assertTrue(PhotoUpload.objects.filter(pk=pk).exists())
+
+    def test_someone_else_upload_not_found(self):
+        pk = self.create_upload().data['id']
+        user = sample_user(
+            email='other@email.com', name='other',
+            password='TestPassword!123')
+        self.client.force_authenticate(user)
+
+        res = self.send_chunk(pk, 0, self.content)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_expire_photo_uploads(self):
+        old = PhotoUpload.objects.get(pk=self.create_upload().data['id'])
+        fresh = PhotoUpload.objects.get(pk=self.create_upload().data['id'])
+        PhotoUpload.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_photo_uploads(), 1)
+
+        self.assertFalse(os.path.exists(old.path))
+        self.assertTrue(os.path.exists(fresh.path))
+
+    def test_missing_upload_file_is_logged(self):
+        upload = PhotoUpload.objects.get(pk=self.create_upload().data['id'])
+        path = upload.path
+        os.remove(path)
+
+        with self.assertLogs('core.signals', 'WARNING') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            upload.delete()
+
+        self.assertIn(path, logs.output[0])
@@ -2,9 +2,10 @@ from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
 
-from .views import AlbumAPIViewSet
+from .views import AlbumAPIViewSet, PhotoUploadViewSet
 
 router = DefaultRouter()
+router.register('uploads', PhotoUploadViewSet, basename='photo-upload')
 router.register('', AlbumAPIViewSet)
 
 app_name = 'album'
@@ -1,45 +1,325 @@
-from rest_framework import viewsets, permissions, status
-from rest_framework.pagination import PageNumberPagination
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from rest_framework import mixins, views, viewsets, permissions, status
+from rest_framework.generics import get_object_or_404
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse
+)
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date, parse_http_date_safe
 from django.utils.translation import gettext_lazy as _
-from django.shortcuts import get_object_or_404
 
+from . import cache as album_cache
+from .archive import stream_zip
 from .permissions import IsOwnerOrReadOnly
 from .serializers import (
+    AlbumListRepresentation,
     AlbumSerializer,
     AlbumDetailSerializer,
-    AlbumPhotoSerializer
+    AlbumPhotoSerializer,
+    AlbumPhotoBatchSerializer,
+    PhotoUploadSerializer
 )
 
-from core.models import Album, AlbumLike, AlbumPhoto
+from core import images, like_buffer
+from core.models import Album, AlbumLike, AlbumPhoto, PhotoUpload
+from core.renderers import FastJSONRenderer
+from core.uploadhandlers import UploadLimitMixin
 
 
-class CustomPaginator(PageNumberPagination):
-    """Override page_size."""
+class CustomCursorPaginator(CursorPagination):
+    """Keyset pagination, pages cost the same no matter how deep."""
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 1000
+    ordering = '-id'
+
+
+def album_validators(album_pk, updated_at):
+    """Return ETag and Last-Modified values of an album."""
+    etag = quote_etag(f'{album_pk}-{updated_at.timestamp():.6f}')
+    return etag, int(updated_at.timestamp())
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) of a single `bytes=` range, None to send it all.
+
+    Malformed and multiple ranges are ignored, ranges starting past the
+    end raise ValueError.
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range, the last `last` bytes.
+        if int(last) == 0:
+            raise ValueError('Empty suffix range.')
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError('Range starts past the end.')
+    return start, end
+
+
+def read_range(file, start, length, chunk_size=64 * 1024):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
 
 
-class AlbumAPIViewSet(viewsets.ModelViewSet):
-    queryset = Album.objects.select_related('owner').order_by('-id')
+def conditional_response(request, response):
+    """Answer a conditional request with validators set on the response."""
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified')),
+        response=response)
+
+
+class AlbumAPIViewSet(UploadLimitMixin, viewsets.ModelViewSet):
+    queryset = Album.objects.order_by('-id')
     serializer_class = AlbumSerializer
     permission_classes = (
         permissions.IsAuthenticatedOrReadOnly,
         IsOwnerOrReadOnly
     )
-    pagination_class = CustomPaginator
+    pagination_class = CustomCursorPaginator
+
+    expandable_fields = ('images',)
+    stream_renderer_class = FastJSONRenderer
+    upload_actions = ('upload_photo', 'upload_photos')
+
+    def get_queryset(self):
+        """Shape the album query according to action and chosen fields."""
+        queryset = super().get_queryset()
+        if self.action in ('like_album', 'delete_photo'):
+            # Only the permission check needs the album row.
+            return queryset.only('id', 'owner_id')
+        if self.action == 'download':
+            return queryset.only('id', 'owner_id', 'updated_at')
+        if self.action in ('upload_photo', 'upload_photos'):
+            # Upload paths are built from the owner's email.
+            return queryset.select_related('owner').only(
+                'id', 'owner_id', 'photo_count', 'owner__email')
+        fields = self.get_field_names()
+        if 'owner' in fields:
+            queryset = queryset.select_related('owner')
+        if 'images' in fields:
+            queryset = queryset.prefetch_related('images')
+        if 'liked_by_me' in fields:
+            queryset = queryset.annotate(liked_by_me=Exists(
+                AlbumLike.objects.filter(
+                    album=OuterRef('pk'), user_liked=self.request.user)))
+        return queryset
+
+    def get_upload_max_files(self):
+        if self.action == 'upload_photos':
+            return settings.ALBUM_PHOTOS_LIMIT
+        return 1
+
+    def get_field_names(self):
+        """Return field names chosen with ?fields= and ?expand=."""
+        if self.action in ('list', 'retrieve'):
+            fields = self.get_sparse_field_names()
+        elif self.action in ('update', 'partial_update'):
+            fields = AlbumDetailSerializer.Meta.fields
+        else:
+            fields = AlbumSerializer.Meta.fields
+        if not self.request.user.is_authenticated:
+            fields = [name for name in fields if name != 'liked_by_me']
+        return fields
+
+    def get_sparse_field_names(self):
+        """Parse and validate ?fields= and ?expand= query parameters."""
+        def parse(param):
+            value = self.request.query_params.get(param, '')
+            return [name for name in value.split(',') if name]
+
+        expand = parse('expand')
+        unknown = set(expand) - set(self.expandable_fields)
+        if unknown:
+            msg = _('Unknown fields: %s.') % ', '.join(sorted(unknown))
+            raise ValidationError({'expand': msg})
+
+        default = AlbumSerializer.Meta.fields
+        if self.action == 'retrieve':
+            default = AlbumDetailSerializer.Meta.fields
+        fields = parse('fields') or default
+        unknown = set(fields) - set(AlbumDetailSerializer.Meta.fields)
+        if unknown:
+            msg = _('Unknown fields: %s.') % ', '.join(sorted(unknown))
+            raise ValidationError({'fields': msg})
+        return [
+            name for name in AlbumDetailSerializer.Meta.fields
+            if name in fields or name in expand
+        ]
+
+    def get_serializer(self, *args, **kwargs):
+        """Limit list and detail serializers to the chosen fields."""
+        if self.action in ('list', 'retrieve'):
+            kwargs.setdefault('fields', self.get_field_names())
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        """List albums, anonymous readers are served from the cache."""
+        if request.query_params.get('stream', '').lower() in ('1', 'true'):
+            return self.stream_list(request)
+        return self.cached_response(self.fast_list, request, *args, **kwargs)
+
+    def stream_list(self, request):
+        """Stream the requested page, rendered chunk by chunk."""
+        queryset = self.filter_queryset(self.get_queryset())
+        # The paginator only holds the ids, rows are fetched in chunks.
+        pks = [row['id'] for row in self.paginate_queryset(
+            queryset.values('id'))]
+        representation = self.get_list_representation()
+        if representation is not None:
+            queryset = representation.values(queryset)
+        chunk_size = settings.ALBUM_STREAM_CHUNK_SIZE
+        renderer = self.stream_renderer_class()
+        envelope = renderer.render({
+            'next': self.paginator.get_next_link(),
+            'previous': self.paginator.get_previous_link(),
+            'results': [],
+        })
+
+        def render():
+            # The envelope ends with the empty results array and a brace.
+            separator = envelope[:-2]
+            for start in range(0, len(pks), chunk_size):
+                # The queryset order matches the page order.
+                chunk = list(queryset.filter(
+                    pk__in=pks[start:start + chunk_size]))
+                if not chunk:
+                    # Deleted since the page was read.
+                    continue
+                data = self.serialize_list(chunk, representation)
+                # Drop the brackets, chunks are joined into one array.
+                yield separator + renderer.render(data)[1:-1]
+                separator = b','
+            yield envelope[-2:] if separator == b',' else envelope
+
+        return StreamingHttpResponse(
+            render(), content_type=renderer.media_type)
+
+    def fast_list(self, request, *args, **kwargs):
+        """List albums, through the fast representation when possible."""
+        queryset = self.filter_queryset(self.get_queryset())
+        representation = self.get_list_representation()
+        if representation is not None:
+            queryset = representation.values(queryset)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(
+            self.serialize_list(page, representation))
+
+    def get_list_representation(self):
+        """Return the fast list representation if the fields allow it."""
+        fields = self.get_field_names()
+        if AlbumListRepresentation.supports(fields):
+            return AlbumListRepresentation(fields)
+        return None
+
+    def serialize_list(self, rows, representation=None):
+        """Serialize list rows, .values() rows if representation is set."""
+        like_buffer.merge(rows)
+        if representation is not None:
+            return representation.to_representation(rows)
+        return self.get_serializer(rows, many=True).data
+
+    def retrieve(self, request, *args, **kwargs):
+        """Album details, anonymous readers are served from the cache."""
+        return self.cached_response(
+            self.conditional_retrieve, request, *args, **kwargs)
+
+    def conditional_retrieve(self, request, *args, **kwargs):
+        """Answer If-None-Match/If-Modified-Since before serializing."""
+        pk, updated_at = get_object_or_404(
+            Album.objects.values_list('pk', 'updated_at'), pk=kwargs['pk'])
+        etag, last_modified = album_validators(pk, updated_at)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            instance = like_buffer.merge([self.get_object()])[0]
+            etag, last_modified = album_validators(
+                instance.pk, instance.updated_at)
+            serializer = self.get_serializer(instance)
+            response = Response(serializer.data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def cached_response(self, view, request, *args, **kwargs):
+        """Return cached response data or cache a fresh response."""
+        if request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        pk = kwargs.get('pk')
+        version = album_cache.get_version(pk)
+        cached = album_cache.get_response_data(request, version, pk)
+        if cached is not None:
+            data, headers = cached
+            response = Response(data, headers=headers)
+            return conditional_response(request, response)
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            headers = {
+                header: response[header]
+                for header in ('ETag', 'Last-Modified')
+                if response.has_header(header)
+            }
+            album_cache.set_response_data(
+                request, (response.data, headers), version, pk)
+        return response
 
     def perform_create(self, serializer):
         """Create an album with authenticated user."""
         serializer.save(owner=self.request.user)
+        album_cache.invalidate()
+
+    def perform_update(self, serializer):
+        """Update an album and drop its cached responses."""
+        super().perform_update(serializer)
+        album_cache.invalidate(serializer.instance.pk)
+
+    def perform_destroy(self, instance):
+        """Delete an album and drop its cached responses."""
+        pk = instance.pk
+        super().perform_destroy(instance)
+        album_cache.invalidate(pk)
 
     def get_serializer_class(self):
         """Change serializer class according to action."""
         if self.action in ('retrieve', 'update', 'partial_update'):
             self.serializer_class = AlbumDetailSerializer
+        if self.action == 'list' and 'images' in self.get_field_names():
+            self.serializer_class = AlbumDetailSerializer
         if self.action == 'upload_photo':
             self.serializer_class = AlbumPhotoSerializer
         return self.serializer_class
@@ -48,20 +328,16 @@ class AlbumAPIViewSet(viewsets.ModelViewSet):
             url_path='like', name='like-album')
     def like_album(self, request, pk=None):
         """Like/dislike an album action."""
-        try:
-            logged_user_likes = request.user.albumlike_set.\
-                select_related('album').select_related('user_liked')
-            like = logged_user_likes.get(album=pk)
-            # Dislike an album.
-            if request.method == 'DELETE':
-                like.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-        except AlbumLike.DoesNotExist:
-            # Like an album
-            if request.method == 'POST':
-                AlbumLike.objects.create(
-                    album=self.get_object(), user_liked=request.user)
+        album = self.get_object()
+        if request.method == 'POST':
+            # Like an album.
+            if AlbumLike.objects.like(album, request.user):
+                album_cache.invalidate(album.pk)
                 return Response(status=status.HTTP_201_CREATED)
+        elif AlbumLike.objects.unlike(album, request.user):
+            # Dislike an album.
+            album_cache.invalidate(album.pk)
+            return Response(status=status.HTTP_204_NO_CONTENT)
         # Liked/disliked handling.
         msg = _('Already liked or disliked.')
         return Response({'detail': msg}, status=status.HTTP_400_BAD_REQUEST)
@@ -73,15 +349,242 @@ class AlbumAPIViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
             serializer.save()
+            album_cache.invalidate(serializer.instance.album_id)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['post'],
+            url_path='upload-photos', name='upload-photos')
+    def upload_photos(self, request, pk=None):
+        """Upload several photos to an album in one request."""
+        album = self.get_object()
+        partial = request.query_params.get('partial') in ('1', 'true')
+        serializer = AlbumPhotoBatchSerializer(
+            data={'images': request.FILES.getlist('images')},
+            context={'album': album, 'partial': partial})
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        album_cache.invalidate(album.pk)
+
+        data = []
+        for result in results:
+            photo = result.pop('photo', None)
+            if photo is not None:
+                result.update(AlbumPhotoSerializer(
+                    photo, context=self.get_serializer_context()).data)
+            data.append(result)
+        code = status.HTTP_201_CREATED
+        if any('errors' in result for result in data):
+            code = status.HTTP_207_MULTI_STATUS
+        return Response({'results': data}, status=code)
+
+    @action(detail=True, methods=['get'],
+            url_path='download', name='download-album')
+    def download(self, request, pk=None):
+        """Stream the album photos as a ZIP archive."""
+        album = self.get_object()
+        photos = AlbumPhoto.objects.filter(album=album).only(
+            'id', 'image').order_by('id')
+
+        def entries():
+            for photo in photos.iterator():
+                try:
+                    file = photo.image.open('rb')
+                except (FileNotFoundError, ValueError):
+                    continue
+                extension = os.path.splitext(photo.image.name)[1]
+                yield f'{photo.pk}{extension}', file
+
+        response = StreamingHttpResponse(
+            stream_zip(entries(), album.updated_at.timetuple()[:6]),
+            content_type='application/zip')
+        response['Content-Disposition'] = (
+            f'attachment; filename="album-{album.pk}.zip"')
+        return response
+
     @action(detail=True, methods=['delete'], name='delete-photo',
             url_path='delete-photo/(?P<photo_pk>\w+)',) # noqa
     def delete_photo(self, request, pk=None, photo_pk=None):
         """Delete photo from an album action."""
         image = get_object_or_404(AlbumPhoto, pk=photo_pk)
-        if image.album == self.get_object():
+        if image.album_id == self.get_object().pk:
             image.delete()
+            album_cache.invalidate(image.album_id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         msg = _('Wrong album.')
         return Response({'detail': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PhotoUploadViewSet(mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         mixins.DestroyModelMixin,
+                         viewsets.GenericViewSet):
+    """
+    Resumable photo uploads.
+
+    POST opens an upload, PATCH appends the bytes sent at Upload-Offset,
+    HEAD tells where to resume and finalize turns it into a photo.
+    """
+    serializer_class = PhotoUploadSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    offset_header = 'Upload-Offset'
+
+    def get_queryset(self):
+        queryset = PhotoUpload.objects.filter(
+            album__owner=self.request.user).select_related('album__owner')
+        if self.action == 'finalize':
+            # One request at a time writes to an upload.
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def offset_response(self, upload, code=status.HTTP_204_NO_CONTENT,
+                        data=None):
+        response = Response(data, status=code)
+        response[self.offset_header] = upload.offset
+        return response
+
+    def offset_mismatch(self, upload):
+        msg = _('Upload offset does not match.')
+        return self.offset_response(
+            upload, status.HTTP_409_CONFLICT, {'detail': msg})
+
+    def retrieve(self, request, *args, **kwargs):
+        """Upload details, the Upload-Offset header tells where to resume."""
+        upload = self.get_object()
+        return self.offset_response(
+            upload, status.HTTP_200_OK, self.get_serializer(upload).data)
+
+    def partial_update(self, request, *args, **kwargs):
+        """Append the request body at the offset sent in Upload-Offset."""
+        upload = self.get_object()
+        if request.headers.get(self.offset_header) != str(upload.offset):
+            return self.offset_mismatch(upload)
+        try:
+            chunk_file = upload.receive(request.stream)
+        except ValueError:
+            msg = _('Upload is bigger than its size.')
+            return self.offset_response(
+                upload, status.HTTP_400_BAD_REQUEST, {'detail': msg})
+        # The row is locked only to copy the received bytes in place.
+        with chunk_file, transaction.atomic():
+            locked = get_object_or_404(
+                self.get_queryset().select_for_update(), pk=upload.pk)
+            if locked.offset != upload.offset:
+                # Another request appended meanwhile, drop these bytes.
+                return self.offset_mismatch(locked)
+            locked.append(chunk_file)
+        return self.offset_response(locked)
+
+    @action(detail=True, methods=['post'], name='finalize-upload')
+    @transaction.atomic
+    def finalize(self, request, pk=None):
+        """Create an album photo from a complete upload."""
+        upload = self.get_object()
+        if not upload.is_complete:
+            msg = _('Upload is not complete.')
+            return self.offset_response(
+                upload, status.HTTP_400_BAD_REQUEST, {'detail': msg})
+        with open(upload.path, 'rb') as part:
+            serializer = AlbumPhotoSerializer(
+                data={'image': File(part, name=upload.filename)},
+                context={**self.get_serializer_context(),
+                         'album': upload.album})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        upload.delete()
+        album_cache.invalidate(upload.album_id)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class MediaNegotiation(BaseContentNegotiation):
+    """Answer any Accept header, errors are rendered as JSON."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class MediaView(views.APIView):
+    """
+    Serve uploaded media after the album permission check.
+
+    With MEDIA_ACCEL set the front proxy is told to send the file, by an
+    X-Accel-Redirect or X-Sendfile header, and no bytes pass through
+    Python. Otherwise the file is streamed here, with Range support.
+    """
+    permission_classes = (
+        permissions.IsAuthenticatedOrReadOnly,
+        IsOwnerOrReadOnly
+    )
+    renderer_classes = (FastJSONRenderer,)
+    content_negotiation_class = MediaNegotiation
+    http_method_names = ['get', 'head', 'options']
+
+    def get(self, request, name):
+        album = self.get_album(name)
+        if album is not None:
+            self.check_object_permissions(request, album)
+        elif not get_user_model().objects.filter(image=name).exists():
+            # Raw uploads, orphans and anything else stay private.
+            raise Http404
+
+        content_type = mimetypes.guess_type(name)[0]
+        content_type = content_type or 'application/octet-stream'
+        if settings.MEDIA_ACCEL == 'nginx':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = quote(
+                settings.MEDIA_ACCEL_PREFIX + name)
+        elif settings.MEDIA_ACCEL == 'sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = default_storage.path(name)
+        else:
+            response = self.stream(request, name, content_type)
+        response['Cache-Control'] = (
+            f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable')
+        return response
+
+    def get_album(self, name):
+        """Return the album of the photo stored as, or resized to, `name`."""
+        lookup = Q(image=name)
+        stem, extension = os.path.splitext(name)
+        if extension[1:] in images.FORMATS:
+            for size in settings.ALBUM_PHOTO_SIZES:
+                base, marker = stem.rpartition(f'_{size}')[:2]
+                if marker:
+                    lookup |= Q(image__startswith=f'{base}.')
+        photos = AlbumPhoto.objects.filter(lookup).select_related(
+            'album').only('image', 'sizes', 'album__id', 'album__owner_id')
+        for photo in photos.iterator():
+            if name == photo.image.name or name in images.derivative_names(
+                    photo.sizes):
+                return photo.album
+        return None
+
+    def stream(self, request, name, content_type):
+        try:
+            file = default_storage.open(name, 'rb')
+        except FileNotFoundError:
+            raise Http404
+        size = file.size
+        try:
+            byte_range = parse_range(request.headers.get('Range', ''), size)
+        except ValueError:
+            file.close()
+            response = HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(file, start, end - start + 1),
+                status=status.HTTP_206_PARTIAL_CONTENT,
+                content_type=content_type)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
@@ -77,6 +77,16 @@ REST_FRAMEWORK = {
     'DEFAULT_THROTTLE_RATES': {
         'anon': '1/day',
     },
+    # orjson backed, fall back to the stdlib json when it is not installed
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 # Simple_jwt settings
@@ -143,6 +153,20 @@ CACHES = {
 
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')
+CELERY_BEAT_SCHEDULE = {
+    'flush-like-buffer': {
+        'task': 'core.tasks.flush_like_buffer',
+        'schedule': 10.0,
+    },
+    'expire-photo-uploads': {
+        'task': 'album.tasks.expire_photo_uploads',
+        'schedule': 60.0 * 60,
+    },
+    'delete-orphan-blob-files': {
+        'task': 'core.tasks.delete_orphan_blob_files',
+        'schedule': 60.0 * 60 * 24,
+    },
+}
 
 
 # Password validation
@@ -211,3 +235,52 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Album limits
 ALBUM_LIMIT = 3
 ALBUM_PHOTOS_LIMIT = 10
+
+# Resized photo derivatives, size name to the longest edge in pixels
+ALBUM_PHOTO_SIZES = {'thumb': 256, 'medium': 1024, 'large': 2048}
+ALBUM_PHOTO_FORMATS = ('webp', 'jpeg')
+ALBUM_PHOTO_QUALITY = 80
+# Processes resizing images, 0 resizes inline as do celery prefork
+# pool children, which cannot fork
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+# Images with more pixels are rejected before they are decoded
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 40_000_000))
+# Photos whose perceptual hashes differ in at most this many bits are
+# near duplicates, the indexed lookup finds up to 3
+ALBUM_PHOTO_DUPLICATE_DISTANCE = 3
+# Reject near duplicates of photos in the album instead of flagging them
+ALBUM_PHOTO_REJECT_DUPLICATES = bool(
+    int(os.environ.get('ALBUM_PHOTO_REJECT_DUPLICATES', '0')))
+
+# Profile images are fit into a square of this edge by a celery task
+USER_IMAGE_SIZE = 200
+USER_IMAGE_FORMAT = 'webp'
+# Rows removed per transaction when a deleted account is cleared out
+USER_DELETE_BATCH_SIZE = 500
+
+# Resumable photo uploads, appended chunk by chunk outside MEDIA_ROOT
+PHOTO_UPLOAD_DIR = os.environ.get(
+    'PHOTO_UPLOAD_DIR', '/vol/web/photo_uploads')
+PHOTO_UPLOAD_MAX_SIZE = 1024 * 1024
+PHOTO_UPLOAD_EXPIRY = 60 * 60 * 24
+
+# Photo blob files without a blob row and older than this are deleted
+PHOTO_BLOB_ORPHAN_AGE = 60 * 60 * 24
+
+# Media transfers handed to the front proxy: 'nginx' answers with
+# X-Accel-Redirect to MEDIA_ACCEL_PREFIX, 'sendfile' with X-Sendfile,
+# empty streams the files from the app
+MEDIA_ACCEL = os.environ.get('MEDIA_ACCEL', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Media names never get new content, caches may keep files for a year
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Album response cache timeout in seconds
+ALBUM_CACHE_TIMEOUT = 60 * 15
+
+# Number of albums fetched per database round trip in streaming lists
+ALBUM_STREAM_CHUNK_SIZE = 200
+
+# Buffer like counter changes in Redis, flushed by a periodic celery task
+ALBUM_LIKES_WRITE_BUFFER = bool(
+    int(os.environ.get('ALBUM_LIKES_WRITE_BUFFER', '0')))
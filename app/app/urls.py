@@ -16,7 +16,6 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.views.generic import TemplateView
 
 from rest_framework_simplejwt.views import (
@@ -24,6 +23,8 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from album.views import MediaView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('__debug__/', include('debug_toolbar.urls')),
@@ -35,6 +36,9 @@ urlpatterns = [
          name='token_refresh'),
     path('api/user/', include('user.urls')),
     path('api/albums/', include('album.urls')),
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:name>',
+         MediaView.as_view(),
+         name='media'),
     path('docs/',
          TemplateView.as_view(template_name='swagger.html'),
          name='documentation'),
@@ -42,9 +46,3 @@ urlpatterns = [
          TemplateView.as_view(template_name='index.html'),
          name='main-page')
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
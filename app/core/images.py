@@ -0,0 +1,181 @@
+"""
+Resized derivatives of uploaded photos.
+
+Rendering is CPU-bound Pillow work, so workers run it in a process
+pool and keep their own process free for I/O. Everything passed to the
+pool is plain bytes and tuples to stay picklable. Daemonic processes,
+like the children of the celery prefork pool, cannot start a pool and
+render inline; the prefork pool already isolates them.
+"""
+import functools
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+
+# Pillow format names of the file extensions used in derivative names.
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+class ImageTooLarge(ValueError):
+    """The image has more pixels than the budget allows."""
+
+
+class ImageCrashed(ValueError):
+    """Rendering the image killed a process of the pool."""
+
+
+def decode(image, edge, max_pixels):
+    """
+    Load an opened image at the smallest scale covering an edge x edge box.
+
+    The pixel budget is checked against the header first. JPEG can then
+    decode straight at 1/2, 1/4 or 1/8 scale; twice the edge is kept so
+    the following resize still has pixels to filter.
+    """
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageTooLarge(
+            f'{width}x{height} image exceeds {max_pixels} pixels.')
+    image.draft(None, (edge * 2, edge * 2))
+    image.load()
+
+
+def render_derivatives(data, sizes, formats, quality, max_pixels):
+    """
+    Return (name, extension, content, width, height) tuples for an image.
+
+    `sizes` maps a size name to the longest edge in pixels. Images are
+    rotated according to EXIF, never upscaled, and sizes that would
+    repeat the previous dimensions are skipped.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        decode(image, max(sizes.values()), max_pixels)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert(
+                'RGBA' if 'transparency' in image.info else 'RGB')
+
+        derivatives = []
+        previous = None
+        for name, edge in sorted(sizes.items(), key=lambda item: item[1]):
+            resized = image.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+            if resized.size == previous:
+                continue
+            previous = resized.size
+            for extension in formats:
+                frame = resized
+                if FORMATS[extension] == 'JPEG' and frame.mode != 'RGB':
+                    frame = frame.convert('RGB')
+                output = io.BytesIO()
+                frame.save(output, FORMATS[extension], quality=quality)
+                derivatives.append(
+                    (name, extension, output.getvalue(), *resized.size))
+        return derivatives
+
+
+def render_thumbnail(data, edge, extension, quality, max_pixels):
+    """Return the content of an image fit into an edge x edge box."""
+    with Image.open(io.BytesIO(data)) as image:
+        decode(image, edge, max_pixels)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA') or (
+                FORMATS[extension] == 'JPEG' and image.mode != 'RGB'):
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, FORMATS[extension], quality=quality)
+        return output.getvalue()
+
+
+def difference_hash(data, max_pixels):
+    """
+    Return the 64-bit difference hash of an image.
+
+    Each bit tells whether a pixel of a 9x8 grayscale thumbnail is
+    brighter than its right neighbour, which survives resizing and
+    recompression.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        decode(image, 9, max_pixels)
+        image = ImageOps.exif_transpose(image)
+        pixels = list(
+            image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(0, 72, 9):
+        for left, right in zip(pixels[row:row + 8], pixels[row + 1:row + 9]):
+            value = value << 1 | (left > right)
+    return value
+
+
+def hash_chunks(value):
+    """Split a 64-bit hash into four 16-bit chunks, high bits first."""
+    return tuple((value >> shift) & 0xFFFF for shift in (48, 32, 16, 0))
+
+
+def derivative_names(sizes):
+    """Yield storage names of the files listed in an AlbumPhoto.sizes."""
+    for size in sizes.values():
+        for extension in FORMATS:
+            if extension in size:
+                yield size[extension]
+
+
+@functools.lru_cache(maxsize=None)
+def get_executor():
+    """Return the process pool, None in a process that cannot fork one."""
+    if multiprocessing.current_process().daemon:
+        return None
+    return ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+
+
+def run(func, *args):
+    """Call `func` in the process pool, inline if there is none."""
+    executor = settings.IMAGE_WORKERS and get_executor()
+    if not executor:
+        return func(*args)
+    try:
+        return executor.submit(func, *args).result()
+    except BrokenProcessPool as error:
+        # A crashed pool cannot be reused; start afresh next time. The
+        # image is not retried here, it may crash this process too.
+        executor.shutdown(wait=False)
+        get_executor.cache_clear()
+        raise ImageCrashed('Rendering the image crashed.') from error
+
+
+def render(data):
+    """Render album photo derivatives of an image."""
+    return run(
+        render_derivatives, data, settings.ALBUM_PHOTO_SIZES,
+        settings.ALBUM_PHOTO_FORMATS, settings.ALBUM_PHOTO_QUALITY,
+        settings.IMAGE_MAX_PIXELS)
+
+
+def perceptual_hash(file):
+    """
+    Return the difference hash of an uploaded image, None if unreadable.
+
+    Called while validating a request, so the draft decode runs inline,
+    the process pool is kept for the tasks rendering derivatives.
+    """
+    file.seek(0)
+    data = file.read()
+    file.seek(0)
+    try:
+        return difference_hash(data, settings.IMAGE_MAX_PIXELS)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def render_avatar(data):
+    """Render a profile image of an uploaded image."""
+    return run(
+        render_thumbnail, data, settings.USER_IMAGE_SIZE,
+        settings.USER_IMAGE_FORMAT, settings.ALBUM_PHOTO_QUALITY,
+        settings.IMAGE_MAX_PIXELS)
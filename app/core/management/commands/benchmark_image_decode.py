@@ -0,0 +1,70 @@
+import io
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from django.core.management.base import BaseCommand
+
+from core import images
+
+
+def full_decode_thumbnail(data, edge, extension, quality, max_pixels):
+    """Thumbnail the way it was done before reduced decoding."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, images.FORMATS[extension], quality=quality)
+        return output.getvalue()
+
+
+def measure(func, data, edge, repeat):
+    """Return the best latency and the peak RSS growth of the process."""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data, edge, 'webp', 80, float('inf'))
+        timings.append(time.perf_counter() - start)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux.
+    return min(timings), (after - before) / 1024
+
+
+class Command(BaseCommand):
+    """Compare full and reduced-scale decoding of a large JPEG."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=6000)
+        parser.add_argument('--height', type=int, default=4000)
+        parser.add_argument('--edge', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--path', help='Benchmark this image instead of a generated one.')
+
+    def handle(self, *args, **options):
+        if options['path']:
+            with open(options['path'], 'rb') as image_file:
+                data = image_file.read()
+        else:
+            output = io.BytesIO()
+            size = (options['width'], options['height'])
+            Image.effect_noise(size, 64).convert('RGB').save(
+                output, 'JPEG', quality=90)
+            data = output.getvalue()
+
+        variants = (
+            ('full decode', full_decode_thumbnail),
+            ('reduced decode', images.render_thumbnail),
+        )
+        for label, func in variants:
+            # A fresh process per variant keeps the RSS peaks apart.
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                seconds, rss = executor.submit(
+                    measure, func, data, options['edge'],
+                    options['repeat']).result()
+            self.stdout.write(
+                f'{label}: {seconds * 1000:.1f} ms, '
+                f'peak RSS +{rss:.1f} MB')
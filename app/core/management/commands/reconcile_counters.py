@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import (
+    Case, Count, F, IntegerField, OuterRef, Subquery, Value, When)
+from django.db.models.functions import Coalesce
+
+from core import like_buffer
+from core.models import User, Album, AlbumLike, AlbumPhoto, PhotoBlob
+
+
+def actual_count(model, field):
+    """Return an expression counting `model` rows pointing at the row."""
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+        field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows), 0)
+
+
+class Command(BaseCommand):
+    """Fix drift of denormalized counters in batches."""
+    counters = (
+        (Album, 'like_count', AlbumLike, 'album'),
+        (Album, 'photo_count', AlbumPhoto, 'album'),
+        (User, 'album_count', Album, 'owner'),
+        (PhotoBlob, 'ref_count', AlbumPhoto, 'blob'),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows checked per transaction.')
+
+    def handle(self, *args, **options):
+        fixed = 0
+        for model, counter, related_model, field in self.counters:
+            offsets = None
+            if counter == 'like_count' and like_buffer.is_enabled():
+                # Buffered deltas are already counted in the like rows,
+                # the column must trail them by what is still pending.
+                like_buffer.flush()
+                offsets = like_buffer.pending
+            fixed += self.reconcile(
+                model, counter, actual_count(related_model, field),
+                options['batch_size'], offsets)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled {fixed} counter(s).'))
+
+    def reconcile(self, model, counter, actual, batch_size, offsets=None):
+        """Set drifted counters to `actual` minus `offsets(pks)` by pk."""
+        last_pk = 0
+        fixed = 0
+        while True:
+            pks = list(
+                model.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            with transaction.atomic():
+                expected = actual
+                deltas = offsets(pks) if offsets else None
+                if deltas:
+                    expected = actual - Case(
+                        *[When(pk=pk, then=Value(delta))
+                          for pk, delta in deltas.items()],
+                        default=Value(0), output_field=IntegerField())
+                drifted = model.objects.filter(pk__in=pks).alias(
+                    expected=expected).exclude(**{counter: F('expected')})
+                fixed += model.objects.filter(
+                    pk__in=list(drifted.values_list('pk', flat=True))
+                ).update(**{counter: expected})
+        return fixed
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:12
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_likes(apps, schema_editor):
+    Album = apps.get_model('core', 'Album')
+    AlbumLike = apps.get_model('core', 'AlbumLike')
+    likes = AlbumLike.objects.filter(
+        album=models.OuterRef('pk')).order_by().values('album').annotate(
+            total=models.Count('pk')).values('total')
+    Album.objects.update(like_count=Coalesce(models.Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_album_albumphoto_albumlike'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_likes, migrations.RunPython.noop),
+    ]
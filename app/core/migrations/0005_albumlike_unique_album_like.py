@@ -0,0 +1,38 @@
+# Generated by Django 4.1.7 on 2026-10-18 12:20
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicated_likes(apps, schema_editor):
+    Album = apps.get_model('core', 'Album')
+    AlbumLike = apps.get_model('core', 'AlbumLike')
+    duplicates = AlbumLike.objects.values('album', 'user_liked').annotate(
+        first_id=models.Min('id'), total=models.Count('id')).filter(total__gt=1)
+    album_ids = set()
+    for duplicate in list(duplicates):
+        AlbumLike.objects.filter(
+            album=duplicate['album'], user_liked=duplicate['user_liked'],
+        ).exclude(id=duplicate['first_id']).delete()
+        album_ids.add(duplicate['album'])
+
+    likes = AlbumLike.objects.filter(
+        album=models.OuterRef('pk')).order_by().values('album').annotate(
+            total=models.Count('pk')).values('total')
+    Album.objects.filter(pk__in=album_ids).update(
+        like_count=Coalesce(models.Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_album_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicated_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='albumlike',
+            constraint=models.UniqueConstraint(fields=('album', 'user_liked'), name='unique_album_like'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.7 on 2026-10-18 12:40
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_albums_and_photos(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    Album = apps.get_model('core', 'Album')
+    AlbumPhoto = apps.get_model('core', 'AlbumPhoto')
+    albums = Album.objects.filter(
+        owner=models.OuterRef('pk')).order_by().values('owner').annotate(
+            total=models.Count('pk')).values('total')
+    User.objects.update(album_count=Coalesce(models.Subquery(albums), 0))
+    photos = AlbumPhoto.objects.filter(
+        album=models.OuterRef('pk')).order_by().values('album').annotate(
+            total=models.Count('pk')).values('total')
+    Album.objects.update(photo_count=Coalesce(models.Subquery(photos), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_albumlike_unique_album_like'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='photo_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='album_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            count_albums_and_photos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_album_photo_count_user_album_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='albumphoto',
+            name='sizes',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='albumphoto',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', editable=False, max_length=10),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:11
+
+import core.models
+from django.db import migrations, models
+
+
+def mark_images_ready(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    User.objects.exclude(image__isnull=True).exclude(image='').update(
+        image_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_albumphoto_sizes_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='image_upload',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=core.models.user_image_file_path),
+        ),
+        migrations.RunPython(mark_images_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:19
+
+import core.models
+import core.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_user_image_upload_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='albumphoto',
+            name='image',
+            field=models.ImageField(null=True, upload_to=core.models.album_photo_file_path, validators=[core.utils.ImageValidator()]),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to=core.models.user_image_file_path, validators=[core.utils.ImageValidator(min_height=200, min_width=200)]),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_photoblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='albumphoto',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.albumphoto'),
+        ),
+        migrations.AddField(
+            model_name='albumphoto',
+            name='phash_0',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='albumphoto',
+            name='phash_1',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='albumphoto',
+            name='phash_2',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='albumphoto',
+            name='phash_3',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='albumphoto',
+            index=models.Index(fields=['album', 'phash_0'], name='album_phash_0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='albumphoto',
+            index=models.Index(fields=['album', 'phash_1'], name='album_phash_1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='albumphoto',
+            index=models.Index(fields=['album', 'phash_2'], name='album_phash_2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='albumphoto',
+            index=models.Index(fields=['album', 'phash_3'], name='album_phash_3_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:57
+
+import core.models
+import core.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_albumphoto_phash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='albumphoto',
+            name='image',
+            field=models.ImageField(db_index=True, null=True, upload_to=core.models.album_photo_file_path, validators=[core.utils.ImageValidator()]),
+        ),
+    ]
@@ -1,18 +1,24 @@
+import hashlib
 import os
+import shutil
+import tempfile
 import uuid
+from collections import Counter
 
-from django.db import models
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin
 )
 
-from .utils import (
-    image_size_validator,
-    is_image_gif_ext,
-    image_dimensions_validator
-)
+from django_cleanup import cleanup
+
+from . import images, like_buffer
+from .utils import ImageValidator, read_image_header
 
 
 def user_image_file_path(instance, filename):
@@ -30,6 +36,33 @@ def album_photo_file_path(instance, filename):
         'uploads', 'albums', instance.album.owner.email, filename)
 
 
+def file_digest(file):
+    """Return the sha256 of a file, from the upload handler if it has one."""
+    digest = getattr(file, 'sha256', None)
+    if digest is None:
+        checksum = hashlib.sha256()
+        for chunk in file.chunks():
+            checksum.update(chunk)
+        digest = checksum.hexdigest()
+    return digest
+
+
+PHOTO_BLOB_DIR = os.path.join('uploads', 'albums', 'blobs')
+
+
+def photo_blob_file_path(digest, extension):
+    """Fan blobs out by digest prefix to keep directories small."""
+    return os.path.join(
+        PHOTO_BLOB_DIR, digest[:2], digest[2:4], f'{digest}{extension}')
+
+
+class ImageStatus(models.TextChoices):
+    """Progress of the background processing of an uploaded image."""
+    PENDING = 'pending', 'Pending'
+    READY = 'ready', 'Ready'
+    FAILED = 'failed', 'Failed'
+
+
 class UserManager(BaseUserManager):
     """Modify creating a new user/superuser."""
     def create_user(self, email, name, password=None, **extra_fields):
@@ -56,53 +89,354 @@ class UserManager(BaseUserManager):
 
         return super_user
 
+    def album_slots(self, pk):
+        """Lock a user row and return how many more albums it may own."""
+        count = self.select_for_update().values_list(
+            'album_count', flat=True).get(pk=pk)
+        return settings.ALBUM_LIMIT - count
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(max_length=255, unique=True, blank=False)
     name = models.CharField(max_length=30, unique=True, blank=False)
     image = models.ImageField(null=True, blank=True,
                               upload_to=user_image_file_path,
-                              validators=[
-                                  is_image_gif_ext,
-                                  image_size_validator,
-                                  image_dimensions_validator])
+                              validators=[ImageValidator(
+                                  min_width=200, min_height=200)])
+    # Raw upload waiting to be turned into `image` by a celery task.
+    image_upload = models.ImageField(null=True, blank=True,
+                                     upload_to=user_image_file_path,
+                                     editable=False)
+    image_status = models.CharField(max_length=10,
+                                    choices=ImageStatus.choices,
+                                    blank=True,
+                                    editable=False)
     is_active = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
     activation_uuid = models.UUIDField(default=uuid.uuid4, editable=False)
+    album_count = models.PositiveIntegerField(default=0, editable=False)
 
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
 
 
+class AlbumQuerySet(models.QuerySet):
+    def touch(self):
+        """Mark albums as modified, e.g. after photo or like changes."""
+        return self.update(updated_at=timezone.now())
+
+    def photo_slots(self, pk):
+        """Lock an album row and return how many more photos it may take."""
+        count = self.select_for_update().values_list(
+            'photo_count', flat=True).get(pk=pk)
+        return settings.ALBUM_PHOTOS_LIMIT - count
+
+
 class Album(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     created_date = models.DateField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    photo_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = AlbumQuerySet.as_manager()
 
     def __str__(self):
         return f'Album {self.pk}'
 
 
+class PhotoBlobManager(models.Manager):
+    def store(self, files, storage):
+        """
+        Add a reference per file to the blob holding its content.
+
+        Return the blobs in the order of the files. A file is saved only
+        when no blob has its digest yet. Blob rows stay locked until the
+        caller's transaction ends, so a concurrent sweep of unused blobs
+        cannot remove them meanwhile. Files saved by a transaction that
+        rolls back are left to delete_orphan_blob_files.
+        """
+        digests = [file_digest(file) for file in files]
+        with transaction.atomic(savepoint=False):
+            blobs = self.select_for_update().in_bulk(
+                digests, field_name='digest')
+            new = {}
+            for file, digest in zip(files, digests):
+                if digest in blobs or digest in new:
+                    continue
+                file.seek(0)
+                image_format = read_image_header(file)[0]
+                extension = (f'.{image_format}' if image_format
+                             else os.path.splitext(file.name)[1].lower())
+                # Never reuse a file without a blob, the orphan sweep may
+                # be deleting it; the storage picks a free name instead.
+                name = storage.save(
+                    photo_blob_file_path(digest, extension), file)
+                new[digest] = self.model(digest=digest, name=name)
+            if new:
+                # Blobs stored concurrently are kept, references added below.
+                self.bulk_create(new.values(), ignore_conflicts=True)
+                blobs = self.select_for_update().in_bulk(
+                    digests, field_name='digest')
+                for digest, blob in new.items():
+                    if blobs[digest].name != blob.name:
+                        # Another upload stored the same content first.
+                        storage.delete(blob.name)
+
+            references = Counter(digests)
+            self.filter(digest__in=references).update(
+                ref_count=F('ref_count') + Case(*(
+                    When(digest=digest, then=Value(count))
+                    for digest, count in references.items())))
+            for digest, count in references.items():
+                blobs[digest].ref_count += count
+        return [blobs[digest] for digest in digests]
+
+
+class PhotoBlob(models.Model):
+    """A stored photo file, shared by every photo with the same content."""
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    ref_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PhotoBlobManager()
+
+    def __str__(self):
+        return self.digest
+
+
+PHASH_FIELDS = ('phash_0', 'phash_1', 'phash_2', 'phash_3')
+
+
+class AlbumPhotoQuerySet(models.QuerySet):
+    def near_duplicates(self, hashes, distance):
+        """
+        Map each hash to a photo within `distance` bits of it, if any.
+
+        Hashes at most 3 bits apart share at least one of their four
+        16-bit chunks, so candidates come from index lookups on the
+        chunk columns and only they are compared bit by bit.
+        """
+        hashes = [value for value in hashes if value is not None]
+        if not hashes:
+            return {}
+        lookup = Q()
+        for index, field in enumerate(PHASH_FIELDS):
+            chunks = {images.hash_chunks(value)[index] for value in hashes}
+            lookup |= Q(**{f'{field}__in': chunks})
+        candidates = list(
+            self.filter(lookup).only('album', *PHASH_FIELDS).order_by('pk'))
+        found = {}
+        for value in hashes:
+            for photo in candidates:
+                if (photo.phash ^ value).bit_count() <= distance:
+                    found[value] = photo
+                    break
+        return found
+
+
+# Blob files are shared, they are deleted by core.tasks.delete_unused_blobs.
+@cleanup.ignore
 class AlbumPhoto(models.Model):
     album = models.ForeignKey(Album,
                               related_name='images',
                               on_delete=models.CASCADE)
+    # Indexed, media requests look photos up by file name.
     image = models.ImageField(null=True,
+                              db_index=True,
                               upload_to=album_photo_file_path,
-                              validators=[
-                                  is_image_gif_ext,
-                                  image_size_validator])
+                              validators=[ImageValidator()])
+    status = models.CharField(max_length=10,
+                              choices=ImageStatus.choices,
+                              default=ImageStatus.PENDING,
+                              editable=False)
+    # Derivative file names and dimensions keyed by size name.
+    sizes = models.JSONField(default=dict, blank=True, editable=False)
+    # Photos stored before blobs existed own their file and have no blob.
+    blob = models.ForeignKey(PhotoBlob,
+                             null=True,
+                             blank=True,
+                             related_name='photos',
+                             on_delete=models.PROTECT,
+                             editable=False)
+    # 64-bit perceptual hash in 16-bit chunks, each indexed on its own.
+    phash_0 = models.PositiveIntegerField(null=True, editable=False)
+    phash_1 = models.PositiveIntegerField(null=True, editable=False)
+    phash_2 = models.PositiveIntegerField(null=True, editable=False)
+    phash_3 = models.PositiveIntegerField(null=True, editable=False)
+    # An earlier photo of the album this one is a near duplicate of.
+    duplicate_of = models.ForeignKey('self',
+                                     null=True,
+                                     blank=True,
+                                     related_name='+',
+                                     on_delete=models.SET_NULL,
+                                     editable=False)
+
+    objects = AlbumPhotoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['album', field], name=f'album_{field}_idx')
+            for field in PHASH_FIELDS
+        ]
+
+    @property
+    def phash(self):
+        chunks = [getattr(self, field) for field in PHASH_FIELDS]
+        if None in chunks:
+            return None
+        return chunks[0] << 48 | chunks[1] << 32 | chunks[2] << 16 | chunks[3]
+
+    @phash.setter
+    def phash(self, value):
+        chunks = (None,) * 4 if value is None else images.hash_chunks(value)
+        for field, chunk in zip(PHASH_FIELDS, chunks):
+            setattr(self, field, chunk)
+
+    @classmethod
+    def store_images(cls, photos):
+        """Point uncommitted images at the blobs holding their content."""
+        blobs = PhotoBlob.objects.store(
+            [photo.image.file for photo in photos],
+            cls._meta.get_field('image').storage)
+        for photo, blob in zip(photos, blobs):
+            photo.blob, photo.image = blob, blob.name
 
     def __str__(self):
         return f'Album {self.album.pk} photo'
 
 
+class PhotoUpload(models.Model):
+    """A resumable photo upload, its bytes are appended to a file on disk."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    album = models.ForeignKey(Album,
+                              related_name='uploads',
+                              on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def path(self):
+        return os.path.join(settings.PHOTO_UPLOAD_DIR, f'{self.pk}.part')
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+    def receive(self, stream, chunk_size=64 * 1024):
+        """
+        Spool a stream of the bytes following the offset to a temporary
+        file, return it rewound.
+
+        Nothing is locked while a slow client sends the bytes. Raise
+        ValueError if the stream holds more than the remaining bytes.
+        """
+        remaining = self.size - self.offset
+        written = 0
+        chunk_file = tempfile.TemporaryFile(dir=settings.PHOTO_UPLOAD_DIR)
+        while stream is not None:
+            chunk = stream.read(min(chunk_size, remaining - written + 1))
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > remaining:
+                chunk_file.close()
+                raise ValueError('The upload is bigger than its size.')
+            chunk_file.write(chunk)
+        chunk_file.seek(0)
+        return chunk_file
+
+    def append(self, chunk_file):
+        """
+        Write a received chunk at the current offset and advance it.
+
+        Bytes past the offset left by an interrupted request are dropped
+        first. Callers hold the row lock and check the offset is still
+        the one the chunk was received at.
+        """
+        with open(self.path, 'r+b') as part:
+            part.seek(self.offset)
+            part.truncate()
+            shutil.copyfileobj(chunk_file, part)
+            written = part.tell() - self.offset
+        self.offset += written
+        self.save(update_fields=['offset'])
+        return written
+
+    def __str__(self):
+        return f'Album {self.album_id} upload {self.pk}'
+
+
+class AlbumLikeManager(models.Manager):
+    """Keep Album.like_count in step with like rows."""
+    def like(self, album, user):
+        """Create a like, return False if it already exists."""
+        opts = self.model._meta
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        sql = (
+            f'INSERT INTO {qn(opts.db_table)} '
+            f'({qn(opts.get_field("album").column)}, '
+            f'{qn(opts.get_field("user_liked").column)}) '
+            'VALUES (%s, %s) ON CONFLICT DO NOTHING'
+        )
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [album.pk, user.pk])
+                created = cursor.rowcount == 1
+            if created:
+                self._add_likes(album, 1)
+        return created
+
+    def unlike(self, album, user):
+        """Remove a like, return False if there was nothing to remove."""
+        with transaction.atomic(using=self.db):
+            # A single DELETE statement, likes have no dependent objects.
+            deleted, _ = self.filter(album=album, user_liked=user).delete()
+            if deleted:
+                self._add_likes(album, -deleted)
+        return bool(deleted)
+
+    def delete_user_likes(self, user_pk, limit):
+        """Remove up to `limit` likes given by a user, return the albums."""
+        with transaction.atomic(using=self.db):
+            likes = dict(self.filter(user_liked=user_pk).values_list(
+                'pk', 'album_id')[:limit])
+            self.filter(pk__in=likes).delete()
+            # A user likes an album at most once.
+            for album_pk in likes.values():
+                self._add_likes(Album(pk=album_pk), -1)
+        return list(likes.values())
+
+    def _add_likes(self, album, delta):
+        if like_buffer.is_enabled():
+            # Keep the hot album row out of the transaction.
+            transaction.on_commit(
+                lambda: like_buffer.add(album.pk, delta), using=self.db)
+        else:
+            Album.objects.filter(pk=album.pk).update(
+                like_count=models.F('like_count') + delta,
+                updated_at=timezone.now())
+
+
 class AlbumLike(models.Model):
     album = models.ForeignKey(Album,
                               related_name='likes',
                               on_delete=models.CASCADE)
     user_liked = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    objects = AlbumLikeManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('album', 'user_liked'), name='unique_album_like'),
+        ]
+
     def __str__(self):
         return f'Album {self.album.pk} like'
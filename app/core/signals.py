@@ -0,0 +1,79 @@
+import logging
+import os
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import images
+from .models import User, Album, AlbumPhoto, PhotoBlob, PhotoUpload
+from .tasks import delete_unused_blobs
+
+logger = logging.getLogger(__name__)
+
+
+# Quota counters must stay exact, so these receivers are never suspended.
+@receiver(post_save, sender=Album)
+def count_created_album(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.owner_id).update(
+            album_count=F('album_count') + 1)
+
+
+@receiver(post_delete, sender=Album)
+def count_deleted_album(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.owner_id, album_count__gt=0).update(
+        album_count=F('album_count') - 1)
+
+
+@receiver(post_save, sender=AlbumPhoto)
+def count_created_photo(sender, instance, created, **kwargs):
+    if created:
+        Album.objects.filter(pk=instance.album_id).update(
+            photo_count=F('photo_count') + 1, updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=AlbumPhoto)
+def count_deleted_photo(sender, instance, **kwargs):
+    Album.objects.filter(pk=instance.album_id, photo_count__gt=0).update(
+        photo_count=F('photo_count') - 1, updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=AlbumPhoto)
+def release_photo_blob(sender, instance, using, **kwargs):
+    if instance.blob_id is None:
+        if instance.image:
+            name, storage = instance.image.name, instance.image.storage
+            transaction.on_commit(lambda: storage.delete(name), using=using)
+        return
+    blob_pk = instance.blob_id
+    PhotoBlob.objects.filter(pk=blob_pk, ref_count__gt=0).update(
+        ref_count=F('ref_count') - 1)
+    transaction.on_commit(
+        lambda: delete_unused_blobs.delay([blob_pk]), using=using)
+
+
+@receiver(post_delete, sender=AlbumPhoto)
+def delete_photo_derivatives(sender, instance, using, **kwargs):
+    names = list(images.derivative_names(instance.sizes))
+    if names:
+        storage = instance.image.storage
+        transaction.on_commit(
+            lambda: [storage.delete(name) for name in names], using=using)
+
+
+@receiver(post_delete, sender=PhotoUpload)
+def delete_upload_file(sender, instance, using, **kwargs):
+    path = instance.path
+
+    def delete():
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Every upload has a file, a process not sharing
+            # PHOTO_UPLOAD_DIR with the app would leave it behind.
+            logger.warning('Photo upload file %s not found.', path)
+
+    transaction.on_commit(delete, using=using)
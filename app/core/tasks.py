@@ -1,7 +1,17 @@
+import os
+from datetime import timedelta
+from itertools import islice
+
 from celery import shared_task
+from PIL import Image
 
+from django.core.files.base import ContentFile
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import images, like_buffer
 
 
 @shared_task
@@ -9,3 +19,98 @@ def send_email(email_subject: str, email_body: str, to_whom: str):
     return send_mail(
         subject=email_subject, message=email_body,
         from_email=settings.DEFAULT_FROM_EMAIL, recipient_list=[to_whom])
+
+
+@shared_task
+def flush_like_buffer():
+    return like_buffer.flush()
+
+
+@shared_task
+def make_user_image(user_pk: int):
+    """Turn the raw upload of a user into the profile image."""
+    # Imported here, models import this module through core.utils.
+    from .models import ImageStatus, User, user_image_file_path
+
+    user = User.objects.filter(pk=user_pk).first()
+    if user is None or not user.image_upload:
+        return None
+    upload = user.image_upload.name
+    storage = user.image_upload.storage
+    # Only the task of the latest upload may change the user.
+    latest = User.objects.filter(pk=user_pk, image_upload=upload)
+
+    try:
+        with user.image_upload.open('rb') as image_file:
+            content = images.render_avatar(image_file.read())
+    except (OSError, ValueError, Image.DecompressionBombError):
+        if latest.update(image_upload=None, image_status=ImageStatus.FAILED):
+            storage.delete(upload)
+        return ImageStatus.FAILED
+
+    name = storage.save(
+        user_image_file_path(user, f'image.{settings.USER_IMAGE_FORMAT}'),
+        ContentFile(content))
+    if latest.update(
+            image=name, image_upload=None, image_status=ImageStatus.READY):
+        obsolete = [upload, user.image.name]
+    else:
+        obsolete = [name]
+    for old_name in obsolete:
+        if old_name:
+            storage.delete(old_name)
+    return ImageStatus.READY
+
+
+@shared_task
+def delete_unused_blobs(blob_pks):
+    """Delete photo blobs, and their files, no photo references anymore."""
+    from .models import AlbumPhoto, PhotoBlob
+
+    storage = AlbumPhoto._meta.get_field('image').storage
+    with transaction.atomic():
+        # A blob referenced again meanwhile no longer matches ref_count=0.
+        blobs = list(PhotoBlob.objects.select_for_update().filter(
+            pk__in=blob_pks, ref_count=0))
+        for blob in blobs:
+            storage.delete(blob.name)
+        PhotoBlob.objects.filter(pk__in=[blob.pk for blob in blobs]).delete()
+    return len(blobs)
+
+
+def walk_files(storage, path):
+    """Yield the names of the files under a storage directory."""
+    try:
+        directories, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield os.path.join(path, name)
+    for directory in directories:
+        yield from walk_files(storage, os.path.join(path, directory))
+
+
+@shared_task
+def delete_orphan_blob_files(batch_size=500):
+    """
+    Delete blob files no blob names, older than PHOTO_BLOB_ORPHAN_AGE.
+
+    They are left by uploads whose transaction rolled back. Younger
+    files may belong to a transaction still running.
+    """
+    from .models import PHOTO_BLOB_DIR, AlbumPhoto, PhotoBlob
+
+    storage = AlbumPhoto._meta.get_field('image').storage
+    expired = timezone.now() - timedelta(
+        seconds=settings.PHOTO_BLOB_ORPHAN_AGE)
+    names = walk_files(storage, PHOTO_BLOB_DIR)
+    deleted = 0
+    while batch := list(islice(names, batch_size)):
+        known = set(PhotoBlob.objects.filter(name__in=batch).values_list(
+            'name', flat=True))
+        for name in batch:
+            if (name not in known
+                    and storage.get_modified_time(name) < expired):
+                storage.delete(name)
+                deleted += 1
+    return deleted
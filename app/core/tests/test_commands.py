@@ -1,10 +1,19 @@
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as psycopg2OperationalError
 
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.tests.test_models import (
+    sample_user,
+    sample_album,
+    sample_album_photo,
+    sample_album_like
+)
+from core.models import User, Album, PhotoBlob
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -27,3 +36,91 @@ class ComamndTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class BenchmarkImageDecodeCommandTests(SimpleTestCase):
+
+    def test_benchmark_image_decode(self):
+        out = StringIO()
+
+        call_command(
+            'benchmark_image_decode', width=800, height=600, repeat=1,
+            stdout=out)
+
+        self.assertIn('full decode:', out.getvalue())
+        self.assertIn('reduced decode:', out.getvalue())
+
+
+@override_settings(SUSPEND_SIGNALS=True)
+class ReconcileCountersCommandTests(TestCase):
+
+    def test_reconcile_like_counts(self):
+        users = [
+            sample_user(
+                name=f'testname{i}', email=f'test{i}@email.com',
+                password='testPassword!123')
+            for i in range(3)
+        ]
+        liked = sample_album(owner=users[0], title='liked')
+        drifted = sample_album(owner=users[0], title='drifted')
+        drifted.like_count = 7
+        drifted.save()
+        for user in users:
+            sample_album_like(album=liked, user_liked=user)
+
+        call_command('reconcile_counters', batch_size=1)
+
+        liked.refresh_from_db()
+        drifted.refresh_from_db()
+        self.assertEqual(liked.like_count, 3)
+        self.assertEqual(drifted.like_count, 0)
+
+    @override_settings(ALBUM_LIKES_WRITE_BUFFER=True)
+    @patch('core.like_buffer.flush')
+    @patch('core.like_buffer.pending')
+    def test_reconcile_like_counts_keeps_buffered_deltas(
+            self, patched_pending, patched_flush):
+        user = sample_user(
+            name='testname', email='test@email.com',
+            password='testPassword!123')
+        album = sample_album(owner=user, title='liked')
+        sample_album_like(album=album, user_liked=user)
+        # The like is in the row table, its delta still in the buffer.
+        patched_pending.side_effect = lambda pks: {
+            pk: 1 for pk in pks if pk == album.pk}
+
+        call_command('reconcile_counters')
+
+        patched_flush.assert_called_once_with()
+        album.refresh_from_db()
+        self.assertEqual(album.like_count, 0)
+
+    def test_reconcile_photo_and_album_counts(self):
+        user = sample_user(
+            name='testname', email='test@email.com',
+            password='testPassword!123')
+        album = sample_album(owner=user, title='album')
+        sample_album_photo(album=album, image='image.png')
+        Album.objects.update(photo_count=5)
+        User.objects.update(album_count=0)
+
+        call_command('reconcile_counters')
+
+        album.refresh_from_db()
+        user.refresh_from_db()
+        self.assertEqual(album.photo_count, 1)
+        self.assertEqual(user.album_count, 1)
+
+    def test_reconcile_blob_reference_counts(self):
+        user = sample_user(
+            name='testname', email='test@email.com',
+            password='testPassword!123')
+        album = sample_album(owner=user, title='album')
+        blob = PhotoBlob.objects.create(digest='0' * 64, name='image.png')
+        for _ in range(2):
+            sample_album_photo(album=album, image='image.png', blob=blob)
+
+        call_command('reconcile_counters')
+
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 2)
@@ -0,0 +1,190 @@
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import images
+
+
+def image_bytes(size, mode='RGB', image_format='png', exif=None):
+    output = io.BytesIO()
+    image = Image.new(mode, size)
+    if exif is None:
+        image.save(output, image_format)
+    else:
+        image.save(output, image_format, exif=exif)
+    return output.getvalue()
+
+
+def pattern_bytes(seed, size=(300, 200), image_format='png', **params):
+    """Return an image of random rectangles, the same for the same seed."""
+    rng = random.Random(seed)
+    image = Image.new('RGB', size)
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    for _ in range(20):
+        x, y = rng.randrange(width), rng.randrange(height)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle((x, y, x + width // 3, y + height // 3), fill=color)
+    output = io.BytesIO()
+    image.save(output, image_format, **params)
+    return output.getvalue()
+
+
+def open_derivative(content):
+    return Image.open(io.BytesIO(content))
+
+
+@override_settings(
+    ALBUM_PHOTO_SIZES={'thumb': 100, 'medium': 400, 'large': 1000},
+    ALBUM_PHOTO_FORMATS=('webp', 'jpeg'),
+    IMAGE_WORKERS=0,
+)
+class RenderDerivativesTests(SimpleTestCase):
+
+    def test_render_sizes_and_formats(self):
+        derivatives = images.render(image_bytes((800, 400)))
+
+        self.assertEqual(
+            [(name, extension, width, height)
+             for name, extension, _, width, height in derivatives],
+            [
+                ('thumb', 'webp', 100, 50),
+                ('thumb', 'jpeg', 100, 50),
+                ('medium', 'webp', 400, 200),
+                ('medium', 'jpeg', 400, 200),
+                ('large', 'webp', 800, 400),
+                ('large', 'jpeg', 800, 400),
+            ])
+        for _, extension, content, width, height in derivatives:
+            with open_derivative(content) as image:
+                self.assertEqual(image.format, images.FORMATS[extension])
+                self.assertEqual(image.size, (width, height))
+
+    def test_render_never_upscales(self):
+        derivatives = images.render(image_bytes((300, 200)))
+
+        self.assertEqual(
+            {(name, width, height)
+             for name, _, _, width, height in derivatives},
+            {('thumb', 100, 67), ('medium', 300, 200)})
+
+    def test_render_applies_exif_orientation(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Rotated 90 degrees clockwise.
+
+        derivatives = images.render(
+            image_bytes((400, 200), image_format='jpeg', exif=exif))
+
+        self.assertEqual(derivatives[0][3:], (50, 100))
+        with open_derivative(derivatives[0][2]) as image:
+            self.assertNotIn(0x0112, image.getexif())
+
+    def test_render_transparent_image_as_jpeg(self):
+        derivatives = images.render(image_bytes((200, 200), mode='RGBA'))
+
+        with open_derivative(derivatives[1][2]) as image:
+            self.assertEqual(image.mode, 'RGB')
+
+    @override_settings(IMAGE_WORKERS=2)
+    def test_render_crash_is_not_retried_inline(self):
+        with patch.object(images, 'get_executor') as get_executor, \
+                patch.object(images, 'render_derivatives') as render:
+            get_executor.return_value.submit.side_effect = BrokenProcessPool
+
+            with self.assertRaises(images.ImageCrashed):
+                images.render(image_bytes((200, 200)))
+
+        render.assert_not_called()
+        get_executor.return_value.shutdown.assert_called_once_with(
+            wait=False)
+        get_executor.cache_clear.assert_called_once()
+
+    @override_settings(IMAGE_WORKERS=2)
+    def test_render_inline_in_daemonic_process(self):
+        images.get_executor.cache_clear()
+        self.addCleanup(images.get_executor.cache_clear)
+        with patch('multiprocessing.current_process') as current_process, \
+                patch.object(images, 'ProcessPoolExecutor') as executor:
+            current_process.return_value.daemon = True
+
+            derivatives = images.render(image_bytes((200, 200)))
+            images.render(image_bytes((200, 200)))
+
+        self.assertEqual(len(derivatives), 4)
+        executor.assert_not_called()
+        current_process.assert_called_once_with()
+
+    def test_decode_jpeg_at_reduced_scale(self):
+        with Image.open(io.BytesIO(
+                image_bytes((1600, 1200), image_format='jpeg'))) as image:
+            images.decode(image, 100, 10 ** 8)
+
+            self.assertEqual(image.size, (400, 300))
+
+    def test_decode_checks_pixel_budget(self):
+        with Image.open(io.BytesIO(image_bytes((300, 200)))) as image:
+            with self.assertRaises(images.ImageTooLarge):
+                images.decode(image, 100, 300 * 200 - 1)
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_render_rejects_images_over_pixel_budget(self):
+        with self.assertRaises(images.ImageTooLarge):
+            images.render(image_bytes((100, 100)))
+        with self.assertRaises(images.ImageTooLarge):
+            images.render_avatar(image_bytes((100, 100)))
+
+    def test_derivative_names(self):
+        sizes = {
+            'thumb': {'width': 1, 'height': 1, 'webp': 'a.webp'},
+            'large': {'width': 2, 'height': 2, 'webp': 'b.webp',
+                      'jpeg': 'b.jpeg'},
+        }
+
+        self.assertEqual(
+            list(images.derivative_names(sizes)),
+            ['a.webp', 'b.webp', 'b.jpeg'])
+
+
+class PerceptualHashTests(SimpleTestCase):
+
+    def distance(self, first, second):
+        return (images.difference_hash(first, 10 ** 8) ^
+                images.difference_hash(second, 10 ** 8)).bit_count()
+
+    def test_hash_survives_recompression_and_resizing(self):
+        original = pattern_bytes(1)
+
+        self.assertLessEqual(self.distance(
+            original, pattern_bytes(1, image_format='jpeg', quality=40)), 3)
+        self.assertLessEqual(self.distance(
+            original, pattern_bytes(1, size=(600, 400))), 3)
+
+    def test_different_images_are_far_apart(self):
+        self.assertGreater(
+            self.distance(pattern_bytes(1), pattern_bytes(2)), 10)
+
+    def test_hash_chunks(self):
+        self.assertEqual(
+            images.hash_chunks(0x0123456789ABCDEF),
+            (0x0123, 0x4567, 0x89AB, 0xCDEF))
+
+    @override_settings(IMAGE_WORKERS=2)
+    @patch('core.images.get_executor')
+    def test_perceptual_hash_runs_inline(self, patched_executor):
+        file = io.BytesIO(pattern_bytes(1))
+
+        self.assertEqual(
+            images.perceptual_hash(file),
+            images.difference_hash(pattern_bytes(1), 10 ** 8))
+        patched_executor.assert_not_called()
+
+    def test_perceptual_hash_of_unreadable_file(self):
+        file = io.BytesIO(b'not an image')
+
+        self.assertIsNone(images.perceptual_hash(file))
+        self.assertEqual(file.tell(), 0)
@@ -0,0 +1,252 @@
+from unittest.mock import patch
+
+import redis
+
+from rest_framework.test import APITestCase
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import like_buffer
+from core.models import AlbumLike
+from core.tasks import flush_like_buffer
+from core.tests.test_models import sample_user, sample_album
+
+
+class FakeRedis:
+    """In-memory stand-in for the few Redis commands the buffer uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def set(self, name, value, nx=False, ex=None):
+        if nx and name in self.data:
+            return None
+        self.data[name] = value
+        return True
+
+    def exists(self, name):
+        return int(name in self.data)
+
+    def delete(self, *names):
+        for name in names:
+            self.data.pop(name, None)
+
+    def rename(self, src, dst):
+        if src not in self.data:
+            raise redis.ResponseError('no such key')
+        self.data[dst] = self.data.pop(src)
+
+    def hincrby(self, name, key, amount=1):
+        hash_ = self.data.setdefault(name, {})
+        key = str(key).encode()
+        hash_[key] = str(int(hash_.get(key, 0)) + amount).encode()
+
+    def hmget(self, name, keys):
+        hash_ = self.data.get(name, {})
+        return [hash_.get(str(key).encode()) for key in keys]
+
+    def hgetall(self, name):
+        return dict(self.data.get(name, {}))
+
+    def hkeys(self, name):
+        return list(self.data.get(name, {}))
+
+    def hdel(self, name, *keys):
+        hash_ = self.data.get(name, {})
+        for key in keys:
+            hash_.pop(str(key).encode(), None)
+        if not hash_:
+            # Redis drops empty hashes.
+            self.data.pop(name, None)
+
+
+class FakePipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+        return call
+
+    def execute(self):
+        return [
+            getattr(self.client, name)(*args, **kwargs)
+            for name, args, kwargs in self.calls
+        ]
+
+
+@override_settings(SUSPEND_SIGNALS=True, ALBUM_LIKES_WRITE_BUFFER=True)
+class LikeBufferTests(TestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch('core.like_buffer.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+        self.album = sample_album(owner=self.user, title='album')
+
+    def test_like_is_buffered_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(3):
+                AlbumLike.objects.like(self.album, self.user)
+
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.like_count, 0)
+        self.assertEqual(like_buffer.pending([self.album.pk]), {
+            self.album.pk: 1})
+
+    def test_unlike_is_buffered(self):
+        AlbumLike.objects.create(album=self.album, user_liked=self.user)
+        self.album.like_count = 1
+        self.album.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AlbumLike.objects.unlike(self.album, self.user)
+
+        self.assertEqual(like_buffer.pending([self.album.pk]), {
+            self.album.pk: -1})
+        self.assertEqual(like_buffer.merge([self.album])[0].like_count, 0)
+
+    def test_merge_values_rows(self):
+        like_buffer.add(self.album.pk, 2)
+        rows = [
+            {'id': self.album.pk, 'like_count': 1},
+            {'id': self.album.pk + 1, 'like_count': 5},
+            {'id': self.album.pk},
+        ]
+
+        like_buffer.merge(rows)
+
+        self.assertEqual(rows, [
+            {'id': self.album.pk, 'like_count': 3},
+            {'id': self.album.pk + 1, 'like_count': 5},
+            {'id': self.album.pk},
+        ])
+
+    def test_flush_applies_deltas_in_batches(self):
+        albums = [self.album] + [
+            sample_album(owner=self.user, title=f'album{i}')
+            for i in range(2)
+        ]
+        for delta, album in enumerate(albums, start=1):
+            like_buffer.add(album.pk, delta)
+
+        self.assertEqual(like_buffer.flush(batch_size=2), 3)
+
+        for delta, album in enumerate(albums, start=1):
+            album.refresh_from_db()
+            self.assertEqual(album.like_count, delta)
+        self.assertEqual(like_buffer.pending([self.album.pk]), {})
+        self.assertEqual(self.redis.data, {})
+
+    def test_flush_counts_pending_during_flush(self):
+        like_buffer.add(self.album.pk, 1)
+        self.redis.rename(like_buffer.PENDING_KEY, like_buffer.FLUSHING_KEY)
+        like_buffer.add(self.album.pk, 1)
+
+        self.assertEqual(like_buffer.pending([self.album.pk]), {
+            self.album.pk: 2})
+
+    def test_flush_resumes_without_reapplying(self):
+        albums = [self.album] + [
+            sample_album(owner=self.user, title=f'album{i}')
+            for i in range(2)
+        ]
+        for album in albums:
+            like_buffer.add(album.pk, 1)
+        self.redis.rename(like_buffer.PENDING_KEY, like_buffer.FLUSHING_KEY)
+        # A flush that died after applying the first album's delta.
+        like_buffer._take(self.redis, [albums[0].pk])
+        albums[0].like_count = 1
+        albums[0].save()
+
+        self.assertEqual(like_buffer.flush(), 2)
+
+        for album in albums:
+            album.refresh_from_db()
+            self.assertEqual(album.like_count, 1)
+        self.assertEqual(self.redis.data, {})
+
+    def test_failed_batch_is_put_back(self):
+        like_buffer.add(self.album.pk, 2)
+
+        with patch('core.models.Album.objects.filter',
+                   side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                like_buffer.flush()
+
+        self.assertEqual(like_buffer.pending([self.album.pk]), {
+            self.album.pk: 2})
+        self.assertEqual(like_buffer.flush(), 1)
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.like_count, 2)
+
+    def test_flush_nothing_pending(self):
+        self.assertEqual(like_buffer.flush(), 0)
+
+    def test_flush_is_locked(self):
+        like_buffer.add(self.album.pk, 1)
+        self.redis.set(like_buffer.LOCK_KEY, 1)
+
+        self.assertEqual(like_buffer.flush(), 0)
+
+    @override_settings(
+        CELERY_TASK_ALWAYS_EAGER=True,
+        CELERY_TASK_EAGER_PROPAGATES=True
+    )
+    def test_flush_like_buffer_task(self):
+        like_buffer.add(self.album.pk, 4)
+
+        result = flush_like_buffer.delay()
+
+        self.assertEqual(result.get(), 1)
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.like_count, 4)
+
+
+@override_settings(
+    SUSPEND_SIGNALS=True,
+    ALBUM_LIKES_WRITE_BUFFER=True,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+)
+class LikeBufferAPITests(APITestCase):
+
+    def setUp(self):
+        patcher = patch('core.like_buffer.get_redis', return_value=FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+        self.album = sample_album(owner=self.user, title='album')
+
+    def test_reads_merge_pending_likes(self):
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('album:album-like-album', args=[self.album.pk]))
+
+        res = self.client.get(reverse('album:album-list'))
+        self.assertEqual(res.data['results'][0]['likes'], 1)
+
+        res = self.client.get(
+            reverse('album:album-list'), {'expand': 'images'})
+        self.assertEqual(res.data['results'][0]['likes'], 1)
+
+        res = self.client.get(
+            reverse('album:album-detail', args=[self.album.pk]))
+        self.assertEqual(res.data['likes'], 1)
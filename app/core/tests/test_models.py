@@ -1,17 +1,25 @@
 from unittest.mock import patch
+import hashlib
 import os
 import shutil
 import tempfile
 
 from PIL import Image
 
+from django.conf import settings
+from django.core.files.base import ContentFile
 from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.db import IntegrityError
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    SimpleUploadedFile
+)
 
 from core import models
+from core.tests.test_images import image_bytes
 
 
 def sample_user(**params):
@@ -41,6 +49,9 @@ class ModelTests(TestCase):
         path = '/vol/web/media/uploads/albums/test@email.com'
         if os.path.exists(path):
             shutil.rmtree(path)
+        # Blob files stay behind when the test transaction rolls back.
+        shutil.rmtree(
+            '/vol/web/media/uploads/albums/blobs', ignore_errors=True)
         path = '/vol/web/media/uploads/profile_pics/test@email.com'
         if os.path.exists(path):
             shutil.rmtree(path)
@@ -305,6 +316,178 @@ class ModelTests(TestCase):
 
         self.assertEqual(album.likes.count(), 2)
 
+    def test_album_like_manager_updates_like_count(self):
+        user = sample_user(
+            name='testname', email='test@email.com',
+            password='testPassword!123')
+        album = sample_album(owner=user, title='test')
+
+        self.assertTrue(models.AlbumLike.objects.like(album, user))
+        self.assertFalse(models.AlbumLike.objects.like(album, user))
+        album.refresh_from_db()
+        self.assertEqual(album.like_count, 1)
+
+        self.assertTrue(models.AlbumLike.objects.unlike(album, user))
+        self.assertFalse(models.AlbumLike.objects.unlike(album, user))
+        album.refresh_from_db()
+        self.assertEqual(album.like_count, 0)
+
+    def test_album_like_is_unique(self):
+        user = sample_user(
+            name='testname', email='test@email.com',
+            password='testPassword!123')
+        album = sample_album(owner=user, title='test')
+        sample_album_like(album=album, user_liked=user)
+
+        with self.assertRaises(IntegrityError):
+            sample_album_like(album=album, user_liked=user)
+
+    def test_album_and_photo_counters(self):
+        user = sample_user(
+            name='testname', email='test@email.com',
+            password='testPassword!123')
+        album = sample_album(owner=user, title='test')
+        photos = [
+            sample_album_photo(album=album, image=f'image{i}.png')
+            for i in range(2)
+        ]
+        user.refresh_from_db()
+        album.refresh_from_db()
+        self.assertEqual(user.album_count, 1)
+        self.assertEqual(album.photo_count, 2)
+
+        photos[0].delete()
+        album.refresh_from_db()
+        self.assertEqual(album.photo_count, 1)
+
+        album.delete()
+        user.refresh_from_db()
+        self.assertEqual(user.album_count, 0)
+
+    def test_quota_slots(self):
+        user = sample_user(
+            name='testname', email='test@email.com',
+            password='testPassword!123')
+        album = sample_album(owner=user, title='test')
+        sample_album_photo(album=album, image='image.png')
+
+        self.assertEqual(
+            models.User.objects.album_slots(user.pk),
+            settings.ALBUM_LIMIT - 1)
+        self.assertEqual(
+            models.Album.objects.photo_slots(album.pk),
+            settings.ALBUM_PHOTOS_LIMIT - 1)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_photo_blobs_are_shared_and_reference_counted(self):
+        user = sample_user(
+            name='testname', email='test@email.com',
+            password='testPassword!123')
+        album = sample_album(owner=user, title='test')
+        content = image_bytes((10, 10))
+        photos = [
+            models.AlbumPhoto(
+                album=album, image=SimpleUploadedFile(name, content))
+            for name in ('image.png', 'renamed.jpg')
+        ]
+        models.AlbumPhoto.store_images(photos)
+        for photo in photos:
+            photo.save()
+
+        blob = models.PhotoBlob.objects.get()
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(blob.digest, digest)
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(
+            blob.name,
+            f'uploads/albums/blobs/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertEqual(photos[0].image.name, blob.name)
+        self.assertEqual(photos[1].image.name, blob.name)
+        storage = photos[0].image.storage
+        self.addCleanup(storage.delete, blob.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photos[0].delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(storage.exists(blob.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photos[1].delete()
+        self.assertFalse(models.PhotoBlob.objects.exists())
+        self.assertFalse(storage.exists(blob.name))
+
+    def test_photo_blob_stored_concurrently_keeps_one_file(self):
+        user = sample_user(
+            name='testname', email='test@email.com',
+            password='testPassword!123')
+        album = sample_album(owner=user, title='test')
+        content = image_bytes((10, 10))
+        photo = models.AlbumPhoto(
+            album=album, image=SimpleUploadedFile('image.png', content))
+        storage = photo.image.storage
+        digest = hashlib.sha256(content).hexdigest()
+        winner = storage.save(
+            models.photo_blob_file_path(digest, '.png'), ContentFile(content))
+        self.addCleanup(storage.delete, winner)
+        saved = []
+        save = storage.save
+        bulk_create = models.PhotoBlobManager.bulk_create
+
+        def save_and_record(name, content):
+            saved.append(save(name, content))
+            return saved[-1]
+
+        def bulk_create_after_winner(manager, objs, **kwargs):
+            # The other upload committed its blob in the meantime.
+            models.PhotoBlob.objects.create(digest=digest, name=winner)
+            return bulk_create(manager, objs, **kwargs)
+
+        with patch.object(storage, 'save', save_and_record), \
+                patch.object(models.PhotoBlobManager, 'bulk_create',
+                             bulk_create_after_winner):
+            models.AlbumPhoto.store_images([photo])
+
+        self.assertEqual(photo.blob.name, winner)
+        self.assertNotEqual(saved, [winner])
+        self.assertFalse(storage.exists(saved[0]))
+        self.assertTrue(storage.exists(winner))
+
+    def test_near_duplicates_lookup(self):
+        user = sample_user(
+            name='testname', email='test@email.com',
+            password='testPassword!123')
+        album = sample_album(owner=user, title='test')
+        other = sample_album(owner=user, title='other')
+        value = 0x0123456789ABCDEF
+        photo = sample_album_photo(album=album, image='a.png', phash=value)
+        sample_album_photo(album=other, image='b.png', phash=value)
+        three_bits = value ^ 0b111
+        # One bit off in every chunk, none of the lookups match.
+        four_chunks = value ^ 0x0001000100010001
+
+        found = album.images.near_duplicates(
+            [three_bits, value ^ 0b1111, four_chunks, None], 3)
+
+        self.assertEqual(found, {three_bits: photo})
+        self.assertEqual(photo.phash, value)
+
+    def test_photo_without_blob_deletes_its_file(self):
+        user = sample_user(
+            name='testname', email='test@email.com',
+            password='testPassword!123')
+        album = sample_album(owner=user, title='test')
+        photo = sample_album_photo(
+            album=album,
+            image=SimpleUploadedFile('image.png', image_bytes((10, 10))))
+        storage = photo.image.storage
+        self.assertTrue(storage.exists(photo.image.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.delete()
+
+        self.assertFalse(storage.exists(photo.image.name))
+
     @patch('core.models.uuid.uuid4')
     def test_removing_folder_after_deleting_user(self, mock_uuid):
         """Test of folder deletion after user deletion."""
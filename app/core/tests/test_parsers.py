@@ -0,0 +1,42 @@
+from io import BytesIO
+from unittest.mock import patch
+
+from rest_framework.exceptions import ParseError
+
+from django.test import SimpleTestCase
+
+from ..parsers import FastJSONParser
+
+
+class FastJSONParserTests(SimpleTestCase):
+
+    def setUp(self):
+        self.parser = FastJSONParser()
+
+    def test_parse(self):
+        stream = BytesIO('{"title": "zażółć", "ids": [1, 2]}'.encode())
+
+        self.assertEqual(
+            self.parser.parse(stream),
+            {'title': 'zażółć', 'ids': [1, 2]})
+
+    def test_parse_invalid_json(self):
+        with self.assertRaises(ParseError):
+            self.parser.parse(BytesIO(b'{"title": '))
+
+    def test_parse_nan_is_rejected(self):
+        with self.assertRaises(ParseError):
+            self.parser.parse(BytesIO(b'{"likes": NaN}'))
+
+    def test_parse_other_encoding(self):
+        stream = BytesIO('{"title": "zażółć"}'.encode('utf-16'))
+
+        self.assertEqual(
+            self.parser.parse(stream, parser_context={'encoding': 'utf-16'}),
+            {'title': 'zażółć'})
+
+    @patch('core.parsers.orjson', None)
+    def test_without_orjson(self):
+        self.assertEqual(
+            self.parser.parse(BytesIO(b'{"title": "test"}')),
+            {'title': 'test'})
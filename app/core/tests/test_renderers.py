@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest.mock import patch
+import uuid
+
+from rest_framework.renderers import JSONRenderer
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy as _
+
+from ..renderers import FastJSONRenderer
+
+
+class FastJSONRendererTests(SimpleTestCase):
+
+    def setUp(self):
+        self.renderer = FastJSONRenderer()
+        self.data = OrderedDict([
+            ('id', 1),
+            ('title', 'zażółć "album"'),
+            ('created_date', date(2023, 1, 1)),
+            ('updated_at', datetime(2023, 1, 1, 12, 30, tzinfo=timezone.utc)),
+            ('naive', datetime(2023, 1, 1, 12, 30, 0, 15)),
+            ('uuid', uuid.UUID(int=1)),
+            ('detail', _('Already liked or disliked.')),
+            ('price', Decimal('1.50')),
+            ('tags', ('a', 'b')),
+            ('nested', [{1: None}, True, 1.5]),
+        ])
+
+    def test_output_matches_json_renderer(self):
+        self.assertEqual(
+            self.renderer.render(self.data),
+            JSONRenderer().render(self.data))
+
+    def test_escapes_line_separators(self):
+        data = {'title': 'a\u2028b\u2029c'}
+
+        self.assertEqual(
+            self.renderer.render(data), b'{"title":"a\\u2028b\\u2029c"}')
+
+    def test_render_none(self):
+        self.assertEqual(self.renderer.render(None), b'')
+
+    def test_indent_falls_back_to_json_renderer(self):
+        self.assertEqual(
+            self.renderer.render(
+                self.data, 'application/json; indent=4'),
+            JSONRenderer().render(self.data, 'application/json; indent=4'))
+
+    def test_unsupported_data_falls_back_to_json_renderer(self):
+        data = {'big': 2 ** 70}
+
+        self.assertEqual(self.renderer.render(data), b'{"big":%d}' % 2 ** 70)
+
+    @patch('core.renderers.orjson', None)
+    def test_without_orjson(self):
+        self.assertEqual(
+            self.renderer.render(self.data),
+            JSONRenderer().render(self.data))
@@ -1,7 +1,14 @@
+import os
+import shutil
+import tempfile
+import time
+
 from django.test import TestCase, override_settings
 from django.core import mail
+from django.core.files.base import ContentFile
 
-from ..tasks import send_email
+from .. import models
+from ..tasks import delete_orphan_blob_files, send_email
 
 
 @override_settings(
@@ -17,3 +24,36 @@ class CeleryTasksTest(TestCase):
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].to, ['test@test.com'])
         self.assertTrue(result.successful())
+
+
+class PhotoBlobTasksTest(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    @override_settings(PHOTO_BLOB_ORPHAN_AGE=60)
+    def test_delete_orphan_blob_files(self):
+        storage = models.AlbumPhoto._meta.get_field('image').storage
+        names = {
+            label: storage.save(
+                models.photo_blob_file_path(f'{label:0<64}', '.png'),
+                ContentFile(b'x'))
+            for label in ('old', 'young', 'known')
+        }
+        for name in names.values():
+            self.addCleanup(storage.delete, name)
+        models.PhotoBlob.objects.create(
+            digest='known', name=names['known'])
+        old = time.time() - 120
+        for label in ('old', 'known'):
+            os.utime(storage.path(names[label]), (old, old))
+
+        self.assertEqual(delete_orphan_blob_files(batch_size=1), 1)
+
+        self.assertFalse(storage.exists(names['old']))
+        self.assertTrue(storage.exists(names['young']))
+        self.assertTrue(storage.exists(names['known']))
@@ -0,0 +1,62 @@
+import hashlib
+from io import BytesIO
+
+from django.http.multipartparser import MultiPartParser
+from django.test import SimpleTestCase
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+from core.uploadhandlers import LimitedUploadHandler, UploadTooLarge
+
+
+class FakeFile(BytesIO):
+    def __init__(self, name, content):
+        super().__init__(content)
+        self.name = name
+
+
+class LimitedUploadHandlerTests(SimpleTestCase):
+
+    def parse(self, handler, **files):
+        body = encode_multipart(BOUNDARY, {
+            name: FakeFile(f'{name}.png', content)
+            for name, content in files.items()
+        })
+        meta = {
+            'CONTENT_TYPE': MULTIPART_CONTENT,
+            'CONTENT_LENGTH': len(body),
+        }
+        return MultiPartParser(meta, BytesIO(body), [handler]).parse()
+
+    def test_spools_to_disk_with_checksum(self):
+        content = b'x' * 1000
+
+        _, files = self.parse(LimitedUploadHandler(max_size=1000),
+                              image=content)
+
+        upload = files['image']
+        self.assertTrue(upload.temporary_file_path())
+        self.assertEqual(upload.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(upload.read(), content)
+
+    def test_file_over_max_size(self):
+        with self.assertRaises(UploadTooLarge):
+            self.parse(LimitedUploadHandler(max_size=1000),
+                       image=b'x' * 1001)
+
+    def test_content_length_over_limit(self):
+        handler = LimitedUploadHandler(max_size=1000, max_files=2)
+        limit = 2 * 1000 + handler.envelope_size
+
+        with self.assertRaises(UploadTooLarge):
+            handler.handle_raw_input(BytesIO(), {}, limit + 1, BOUNDARY)
+        self.assertIsNone(
+            handler.handle_raw_input(BytesIO(), {}, limit, BOUNDARY))
+
+    def test_max_size_applies_per_file(self):
+        handler = LimitedUploadHandler(max_size=1000, max_files=2)
+
+        _, files = self.parse(handler, first=b'x' * 1000,
+                              second=b'y' * 1000)
+
+        self.assertEqual(files['first'].size, 1000)
+        self.assertEqual(files['second'].size, 1000)
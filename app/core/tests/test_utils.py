@@ -1,8 +1,14 @@
 from unittest.mock import patch
-from django.test import TestCase, override_settings
+import io
+
+from PIL import Image
+
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
 
-from ..utils import EmailSender
+from ..utils import EmailSender, ImageValidator, read_image_header
 
 from .test_models import sample_user
 
@@ -35,3 +41,106 @@ class UtilsTests(TestCase):
         message = sender.make_message()
 
         self.assertEqual(message, test_message)
+
+
+def image_file(size=(200, 200), image_format='png', name=None, **params):
+    output = io.BytesIO()
+    Image.new('RGB', size).save(output, image_format, **params)
+    name = name or f'image.{image_format.lower()}'
+    return SimpleUploadedFile(name, output.getvalue())
+
+
+class CountingFile(io.BytesIO):
+    """A file recording how many bytes were read from it."""
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class ImageValidatorTests(SimpleTestCase):
+
+    def test_read_image_header(self):
+        exif = Image.Exif()
+        exif[0x010e] = 'x' * 5000  # A long EXIF segment before the frame.
+        cases = (
+            (image_file((300, 200), 'png'), 'png'),
+            (image_file((300, 200), 'jpeg', exif=exif), 'jpeg'),
+            (image_file((300, 200), 'webp'), 'webp'),
+            (image_file((300, 200), 'webp', lossless=True), 'webp'),
+            (image_file((300, 200), 'webp', exif=exif), 'webp'),
+            (image_file((300, 200), 'gif'), 'gif'),
+        )
+        for image, image_format in cases:
+            with self.subTest(image_format=image_format):
+                self.assertEqual(
+                    read_image_header(image), (image_format, 300, 200))
+
+    def test_read_image_header_skips_jpeg_segments(self):
+        exif = Image.Exif()
+        exif[0x010e] = 'x' * 50000
+        image = image_file((300, 200), 'jpeg', exif=exif)
+        file = CountingFile(image.read())
+
+        self.assertEqual(read_image_header(file), ('jpeg', 300, 200))
+        self.assertLess(file.bytes_read, 1000)
+
+    def test_read_image_header_of_unknown_data(self):
+        for data in (b'', b'not an image', b'\xff\xd8\xff\xe0'):
+            with self.subTest(data=data):
+                self.assertEqual(
+                    read_image_header(io.BytesIO(data)), (None, None, None))
+
+    def test_valid_image(self):
+        image = image_file()
+        image.seek(10)
+
+        ImageValidator(min_width=200, min_height=200)(image)
+
+        self.assertEqual(image.tell(), 0)
+
+    def test_extensions_of_detected_format(self):
+        for name in ('image.jpg', 'image.JPEG'):
+            with self.subTest(name=name):
+                ImageValidator()(image_file(image_format='jpeg', name=name))
+
+    def test_invalid_images(self):
+        cases = (
+            (ImageValidator(max_size=10), image_file(), 'size'),
+            (ImageValidator(), image_file(name='image.GIF'), 'gif'),
+            # A GIF renamed to pass the extension check.
+            (ImageValidator(), image_file(image_format='gif',
+                                          name='image.png'), 'gif'),
+            (ImageValidator(), SimpleUploadedFile('a.png', b'text'),
+             'invalid'),
+            (ImageValidator(formats=('jpeg',)), image_file(), 'invalid'),
+            (ImageValidator(min_width=200, min_height=200),
+             image_file((200, 199)), 'dimensions'),
+            (ImageValidator(), image_file(name='image.html'), 'extension'),
+            (ImageValidator(), image_file(name='image.svg'), 'extension'),
+            (ImageValidator(), image_file(name='image'), 'extension'),
+            (ImageValidator(), image_file(image_format='jpeg',
+                                          name='image.png'), 'extension'),
+        )
+        for validator, image, code in cases:
+            with self.subTest(code=code):
+                with self.assertRaises(ValidationError) as cm:
+                    validator(image)
+                self.assertEqual(cm.exception.code, code)
+
+    @override_settings(IMAGE_MAX_PIXELS=200 * 200 - 1)
+    def test_image_over_pixel_budget(self):
+        with self.assertRaises(ValidationError) as cm:
+            ImageValidator()(image_file())
+
+        self.assertEqual(cm.exception.code, 'pixels')
+
+    def test_validator_deconstruct(self):
+        validator = ImageValidator(min_width=200, min_height=200)
+        path, args, kwargs = validator.deconstruct()
+
+        self.assertEqual(path, 'core.utils.ImageValidator')
+        self.assertEqual(ImageValidator(*args, **kwargs), validator)
+        self.assertNotEqual(ImageValidator(), validator)
@@ -0,0 +1,81 @@
+import hashlib
+
+from rest_framework import exceptions, status
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from django.utils.translation import gettext_lazy as _
+
+
+class UploadTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _('Upload is too large.')
+    default_code = 'too_large'
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spool uploaded files to disk, enforcing size limits while streaming.
+
+    A body whose Content-Length exceeds the limits is rejected before it
+    is read, otherwise a file is rejected as soon as it grows past
+    max_size. Finished files carry their sha256 hex digest in `sha256`.
+    """
+    # Room for multipart boundaries, part headers and small form fields.
+    envelope_size = 16 * 1024
+
+    def __init__(self, request=None, max_size=1024 * 1024, max_files=1):
+        super().__init__(request)
+        self.max_size = max_size
+        self.max_files = max_files
+
+    def too_large(self):
+        if self.request is not None:
+            # Later reads of request.POST get empty data, not a reparse.
+            self.request._mark_post_parse_error()
+        msg = _('Max upload file is %(size)s.') % {
+            'size': filesizeformat(self.max_size)}
+        return UploadTooLarge(msg)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        limit = self.max_size * self.max_files + self.envelope_size
+        if content_length > limit:
+            raise self.too_large()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.checksum = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self.file.close()
+            raise self.too_large()
+        self.checksum.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.checksum.hexdigest()
+        return file
+
+
+class UploadLimitMixin:
+    """
+    Read the uploads of `upload_actions` through LimitedUploadHandler.
+
+    None in `upload_actions` limits every request of the view.
+    """
+    upload_actions = None
+    upload_max_size = 1024 * 1024
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        action = getattr(self, 'action', None)
+        if self.upload_actions is None or action in self.upload_actions:
+            request._request.upload_handlers = [LimitedUploadHandler(
+                request._request, max_size=self.upload_max_size,
+                max_files=self.get_upload_max_files())]
+
+    def get_upload_max_files(self):
+        return 1
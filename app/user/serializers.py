@@ -1,23 +1,17 @@
-from PIL import Image
-from io import BytesIO
-
 from rest_framework import serializers
 
 from django.contrib.auth import get_user_model, password_validation
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.db import transaction
 from django.utils.http import urlsafe_base64_decode
 from django.contrib.auth.tokens import default_token_generator as token_generator # noqa
 
 from .validators import SymbolValidator
 
-from core.utils import (
-    image_size_validator,
-    image_dimensions_validator,
-    is_image_gif_ext,
-    EmailSender
-)
+from core.models import ImageStatus
+from core.tasks import make_user_image
+from core.utils import ImageValidator, EmailSender
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -59,31 +53,26 @@ class UserDetailSerializer(UserSerializer):
 
     class Meta(UserSerializer.Meta):
         """Added image field."""
-        fields = UserSerializer.Meta.fields + ['image']
+        fields = UserSerializer.Meta.fields + ['image', 'image_status']
 
 
 class UserImageSerializer(serializers.ModelSerializer):
-    image = serializers.ImageField(
-        validators=(
-            image_size_validator,
-            is_image_gif_ext,
-            image_dimensions_validator
-        ),
+    # ImageValidator checks the header, no need for a decoding ImageField.
+    image = serializers.FileField(
+        validators=(ImageValidator(min_width=200, min_height=200),),
         required=True)
 
     class Meta:
         model = get_user_model()
-        fields = ('image',)
+        fields = ('image', 'image_status')
 
-    def validate_image(self, value):
-        """Image resizing."""
-        io_img = BytesIO()
-        with Image.open(value) as image:
-            image.thumbnail((200, 200))
-            image.save(io_img, 'png', quality=100, subsampling=0)
-            return InMemoryUploadedFile(
-                io_img, 'image', 'image.png',
-                'PNG', io_img.tell(), None)
+    def update(self, instance, validated_data):
+        """Store the raw upload, a celery task makes the thumbnail."""
+        instance.image_upload = validated_data['image']
+        instance.image_status = ImageStatus.PENDING
+        instance.save(update_fields=['image_upload', 'image_status'])
+        transaction.on_commit(lambda: make_user_image.delay(instance.pk))
+        return instance
 
 
 class UserPasswordChangeSerializer(UserDetailSerializer):
@@ -94,7 +83,8 @@ class UserPasswordChangeSerializer(UserDetailSerializer):
     class Meta(UserDetailSerializer.Meta):
         """Set up read_only_fields."""
         fields = UserDetailSerializer.Meta.fields + ['new_password']
-        read_only_fields = ('email', 'name', 'is_active', 'image')
+        read_only_fields = (
+            'email', 'name', 'is_active', 'image', 'image_status')
 
     def validate_password(self, value):
         """Check that the old_password is correct."""
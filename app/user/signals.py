@@ -1,8 +1,6 @@
 import functools
-import os
-import shutil
 
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.conf import settings
@@ -28,15 +26,3 @@ def send_activation_email(sender, instance, created, **kwargs):
         sender = EmailSender(instance)
         message = sender.make_message(activation=True)
         sender.send_email('Activate account', message)
-
-
-@receiver(post_delete, sender=get_user_model())
-def delete_user_folder(sender, instance, using, **kwargs):
-    # Remove albums.
-    path = f'/vol/web/media/uploads/albums/{instance.email}'
-    if os.path.exists(path):
-        shutil.rmtree(path)
-    # Remove profile_pic
-    path = f'/vol/web/media/uploads/profile_pics/{instance.email}'
-    if os.path.exists(path):
-        shutil.rmtree(path)
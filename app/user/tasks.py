@@ -0,0 +1,59 @@
+from celery import shared_task
+
+from django.conf import settings
+from django.db import transaction
+
+from album import cache as album_cache
+from core.models import Album, AlbumLike, AlbumPhoto, PhotoUpload, User
+
+
+def invalidate_albums(album_pks):
+    album_cache.invalidate()
+    for album_pk in set(album_pks):
+        album_cache.invalidate(album_pk)
+
+
+def delete_in_batches(queryset, batch_size, album_field):
+    """Delete the rows of queryset, batch_size rows per transaction."""
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                queryset.values_list('pk', album_field)[:batch_size])
+            if not rows:
+                return deleted
+            # Signals of every row still run, they release files through
+            # the storage API once the batch is committed.
+            queryset.model.objects.filter(
+                pk__in=[pk for pk, _ in rows]).delete()
+        invalidate_albums(album_pk for _, album_pk in rows)
+        deleted += len(rows)
+
+
+@shared_task
+def delete_user(user_pk, batch_size=None):
+    """
+    Delete a user with their likes, albums and photos.
+
+    Rows go in short transactions of at most batch_size rows, so no lock
+    is held for long and the final cascade has nothing left to collect.
+    """
+    batch_size = batch_size or settings.USER_DELETE_BATCH_SIZE
+    if not User.objects.filter(pk=user_pk).exists():
+        return False
+
+    while album_pks := AlbumLike.objects.delete_user_likes(
+            user_pk, batch_size):
+        invalidate_albums(album_pks)
+    delete_in_batches(
+        AlbumLike.objects.filter(album__owner=user_pk), batch_size, 'album')
+    delete_in_batches(
+        PhotoUpload.objects.filter(album__owner=user_pk), batch_size,
+        'album')
+    delete_in_batches(
+        AlbumPhoto.objects.filter(album__owner=user_pk), batch_size,
+        'album')
+    delete_in_batches(Album.objects.filter(owner=user_pk), batch_size, 'pk')
+    # django_cleanup deletes the profile image files on commit.
+    User.objects.filter(pk=user_pk).delete()
+    return True
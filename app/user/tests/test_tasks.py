@@ -0,0 +1,152 @@
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+
+from celery import Celery
+from celery.contrib.testing.worker import start_worker
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from app.celery import app as celery_app
+
+from core.models import Album, AlbumLike, AlbumPhoto, PhotoBlob, User
+from core.tests.test_models import (
+    sample_user,
+    sample_album,
+    sample_album_photo
+)
+from user.tasks import delete_user
+
+
+@override_settings(
+    SUSPEND_SIGNALS=True,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+    CELERY_TASK_ALWAYS_EAGER=True,
+)
+class DeleteUserTests(TestCase):
+
+    def setUp(self):
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+        self.other = sample_user(
+            email='other@email.com', name='other',
+            password='TestPassword!123')
+        self.other_album = sample_album(owner=self.other, title='other')
+
+    def save(self, name):
+        name = default_storage.save(name, ContentFile(b'content'))
+        self.addCleanup(default_storage.delete, name)
+        return name
+
+    def test_delete_user(self):
+        albums = [sample_album(owner=self.user, title=str(i))
+                  for i in range(2)]
+        photos = [
+            sample_album_photo(
+                album=album,
+                image=self.save('uploads/albums/test/photo.png'))
+            for album in albums for _ in range(2)]
+        blob_photo = AlbumPhoto(
+            album=albums[0], image=SimpleUploadedFile('blob.png', b'blob'))
+        AlbumPhoto.store_images([blob_photo])
+        blob_photo.save()
+        blob = blob_photo.blob
+        AlbumLike.objects.like(self.other_album, self.user)
+        AlbumLike.objects.like(albums[0], self.other)
+        self.user.image = self.save('uploads/profile_pics/test/image.webp')
+        self.user.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(delete_user(self.user.pk, batch_size=1))
+
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(Album.objects.filter(owner=self.user.pk).exists())
+        self.assertFalse(AlbumLike.objects.exists())
+        self.assertFalse(PhotoBlob.objects.filter(pk=blob.pk).exists())
+        self.other_album.refresh_from_db()
+        self.assertEqual(self.other_album.like_count, 0)
+        for name in [photo.image.name for photo in photos] + [
+                blob.name, self.user.image.name]:
+            self.assertFalse(default_storage.exists(name), name)
+
+    @patch('user.tasks.album_cache.invalidate')
+    def test_delete_user_invalidates_album_cache(self, mock_invalidate):
+        album = sample_album(owner=self.user, title='album')
+        sample_album_photo(album=album)
+        AlbumLike.objects.like(self.other_album, self.user)
+
+        delete_user(self.user.pk, batch_size=1)
+
+        self.assertEqual(
+            {args for args, _ in mock_invalidate.call_args_list},
+            {(), (self.other_album.pk,), (album.pk,)})
+
+    def test_delete_missing_user(self):
+        self.assertFalse(delete_user(self.user.pk + 100))
+
+
+@override_settings(
+    SUSPEND_SIGNALS=True,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+)
+class DeleteUserWorkerTests(TransactionTestCase):
+    """Run the deletion in a celery worker, with real commits."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # A fresh app talks to an in-memory broker, shared tasks bind to it.
+        worker_app = Celery(
+            'test', broker='memory://', backend='cache+memory://')
+        worker_app.set_default()
+        self.addCleanup(celery_app.set_current)
+        self.addCleanup(celery_app.set_default)
+        worker = start_worker(worker_app, perform_ping_check=False)
+        worker.__enter__()
+        self.addCleanup(worker.__exit__, None, None, None)
+
+        self.user = sample_user(
+            email='test@email.com', name='testname',
+            password='TestPassword!123')
+
+    def assertRemoved(self, names, timeout=10):
+        # Files of committed deletions go in tasks queued meanwhile.
+        deadline = time.monotonic() + timeout
+        while any(map(default_storage.exists, names)):
+            self.assertLess(time.monotonic(), deadline, names)
+            time.sleep(0.05)
+
+    def test_delete_user_files_in_worker(self):
+        album = sample_album(owner=self.user, title='album')
+        photo = AlbumPhoto(
+            album=album, image=SimpleUploadedFile('blob.png', b'blob'))
+        AlbumPhoto.store_images([photo])
+        photo.save()
+        self.user.image = default_storage.save(
+            'uploads/profile_pics/test/image.webp', ContentFile(b'image'))
+        self.user.save()
+        names = [photo.image.name, self.user.image.name]
+        self.assertTrue(all(map(default_storage.exists, names)))
+
+        result = delete_user.delay(self.user.pk, batch_size=1)
+
+        self.assertTrue(result.get(timeout=10))
+        self.assertRemoved(names)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(PhotoBlob.objects.exists())
@@ -1,9 +1,11 @@
+from unittest.mock import patch
 import os
 import shutil
 import tempfile
 
 from PIL import Image
 
+from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.test import override_settings
@@ -12,6 +14,8 @@ from django.contrib.auth.tokens import default_token_generator
 from django.utils.encoding import smart_bytes
 from django.utils.http import urlsafe_base64_encode
 
+from core import images
+from core.tasks import make_user_image
 from core.tests.test_models import sample_user
 
 from rest_framework.test import APITestCase
@@ -498,6 +502,7 @@ class AuthenticatedUserAPITests(APITestCase):
             'email': self.user.email,
             'name': self.user.name,
             'image': None,
+            'image_status': '',
             'is_active': False
         })
 
@@ -511,8 +516,15 @@ class AuthenticatedUserAPITests(APITestCase):
         res = self.client.patch(DETAIL_USER_URL)
         self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
 
-        res = self.client.delete(DETAIL_USER_URL)
-        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+    @patch('user.views.delete_user.delay')
+    def test_delete_user(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.delete(DETAIL_USER_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        mock_delay.assert_called_once_with(self.user.pk)
 
     def test_change_password_correct(self):
         payload = {
@@ -633,7 +645,12 @@ class AuthenticatedUserAPITests(APITestCase):
             "This password is entirely numeric.",)
 
 
-@override_settings(SUSPEND_SIGNALS=True)
+@override_settings(
+    SUSPEND_SIGNALS=True,
+    CELERY_TASK_ALWAYS_EAGER=True,
+    CELERY_TASK_EAGER_PROPAGATES=True,
+    IMAGE_WORKERS=0,
+)
 class UserImageUploadTests(APITestCase):
 
     def setUp(self):
@@ -642,23 +659,99 @@ class UserImageUploadTests(APITestCase):
         self.client.force_authenticate(user=self.user)
 
     def tearDown(self):
+        self.user.refresh_from_db()
         self.user.image.delete()
+        self.user.image_upload.delete()
         path = '/vol/web/media/uploads/albums/test@email.com'
         if os.path.exists(path):
             shutil.rmtree(path)
+        # Blob files stay behind when the test transaction rolls back.
+        shutil.rmtree(
+            '/vol/web/media/uploads/albums/blobs', ignore_errors=True)
 
-    def test_upload_user_image(self):
+    def upload_image(self, size=(400, 300)):
         with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
-            img = Image.new('RGB', (200, 200))
+            img = Image.new('RGB', size)
             img.save(image_file, 'png')
             image_file.seek(0)
             payload = {'image': image_file}
-            res = self.client.put(UPLOAD_USER_IMAGE_URL, payload)
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.client.put(UPLOAD_USER_IMAGE_URL, payload)
+
+    def test_upload_user_image(self):
+        res = self.upload_image()
 
         self.user.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('image', res.data)
+        self.assertEqual(res.data['image_status'], 'pending')
         self.assertTrue(os.path.exists(self.user.image.path))
+        self.assertTrue(self.user.image.name.endswith('.webp'))
+        self.assertFalse(self.user.image_upload)
+        self.assertEqual(self.user.image_status, 'ready')
+        with Image.open(self.user.image.path) as image:
+            self.assertEqual(image.size, (200, 150))
+
+        res = self.client.get(DETAIL_USER_URL)
+        self.assertEqual(res.data['image_status'], 'ready')
+
+    def test_upload_user_image_replaces_previous_image(self):
+        self.upload_image()
+        self.user.refresh_from_db()
+        previous = self.user.image.path
+
+        self.upload_image()
+
+        self.user.refresh_from_db()
+        self.assertFalse(os.path.exists(previous))
+        self.assertTrue(os.path.exists(self.user.image.path))
+
+    def test_upload_user_image_is_processed_in_background(self):
+        with patch('user.serializers.make_user_image.delay') as delay:
+            res = self.upload_image()
+
+        self.user.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        delay.assert_called_once_with(self.user.pk)
+        self.assertFalse(self.user.image)
+        self.assertTrue(os.path.exists(self.user.image_upload.path))
+        self.assertEqual(self.user.image_status, 'pending')
+
+    def test_stale_image_task_keeps_newer_upload(self):
+        with patch('user.serializers.make_user_image.delay'):
+            self.upload_image()
+        users = get_user_model().objects.filter(pk=self.user.pk)
+
+        def render_during_newer_upload(data):
+            users.update(image_upload='uploads/newer.png')
+            return images.render_thumbnail(
+                data, 200, 'webp', 80, settings.IMAGE_MAX_PIXELS)
+
+        with patch(
+                'core.images.render_avatar',
+                side_effect=render_during_newer_upload):
+            make_user_image(self.user.pk)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.image_upload.name, 'uploads/newer.png')
+        self.assertFalse(self.user.image)
+        self.assertEqual(self.user.image_status, 'pending')
+        users.update(image_upload=None)
+
+    def test_image_task_with_broken_upload(self):
+        with patch('user.serializers.make_user_image.delay'):
+            self.upload_image()
+        self.user.refresh_from_db()
+        upload_path = self.user.image_upload.path
+        with open(upload_path, 'wb') as upload:
+            upload.write(b'not an image')
+
+        self.assertEqual(make_user_image(self.user.pk), 'failed')
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.image_status, 'failed')
+        self.assertFalse(self.user.image_upload)
+        self.assertFalse(os.path.exists(upload_path))
 
     def test_upload_image_bigger_than_1MB(self):
         with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
@@ -672,6 +765,19 @@ class UserImageUploadTests(APITestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertFalse(self.user.image)
 
+    def test_upload_image_too_large_rejected_while_streaming(self):
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.new('RGB', (200, 200)).save(image_file, 'png')
+            image_file.truncate(1024 * 1024 + 1)
+            image_file.seek(0)
+            res = self.client.put(
+                UPLOAD_USER_IMAGE_URL, {'image': image_file})
+
+        self.user.refresh_from_db()
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(self.user.image_upload)
+
     def test_uploaded_wrong_dimensions_image(self):
         with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
             img = Image.new('RGB', (100, 100))
@@ -3,8 +3,12 @@ from rest_framework.response import Response
 from rest_framework.throttling import AnonRateThrottle
 from rest_framework.exceptions import Throttled
 
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 
+from core.uploadhandlers import UploadLimitMixin
+
+from .tasks import delete_user
 from .serializers import (
     UserSerializer,
     UserDetailSerializer,
@@ -26,21 +30,35 @@ class CreateUserAPIView(generics.CreateAPIView):
         return Response({'detail': msg}, status=status.HTTP_201_CREATED)
 
 
-class UserDetailAPIView(generics.RetrieveAPIView):
+class UserDetailAPIView(generics.RetrieveDestroyAPIView):
     serializer_class = UserDetailSerializer
 
     def get_object(self):
         """Return authenticated user."""
         return self.request.user
 
+    def destroy(self, request, *args, **kwargs):
+        """Deactivate the account now, its data is deleted later."""
+        user = self.get_object()
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        transaction.on_commit(lambda: delete_user.delay(user.pk))
+        return Response(status=status.HTTP_202_ACCEPTED)
+
 
-class UserImageUploadAPIView(generics.UpdateAPIView):
+class UserImageUploadAPIView(UploadLimitMixin, generics.UpdateAPIView):
     serializer_class = UserImageSerializer
 
     def get_object(self):
         """Return authenticated user."""
         return self.request.user
 
+    def update(self, request, *args, **kwargs):
+        """Accept the upload, the image is processed in the background."""
+        response = super().update(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
 
 class UserPasswordChangeAPIView(generics.UpdateAPIView):
     serializer_class = UserPasswordChangeSerializer